@@ -0,0 +1,72 @@
+"""
+Measures the time and peak memory taken to test a large manifest with
+Organization.test_yarn, given as a string, bytes and a memory-mapped file.
+Requests are answered locally with requests_mock, so no token is needed.
+
+    python benchmarks/manifest_upload.py --size 50
+"""
+
+import argparse
+import mmap
+import os
+import tempfile
+
+import requests_mock
+from utils import measure, report
+
+from snyk import SnykClient
+from snyk.models import Organization
+
+ORG_ID = "a04d9cbd-ae6e-44af-b573-0556b0ad4bd2"
+BLANK_TEST = {
+    "ok": True,
+    "packageManager": "yarn",
+    "dependencyCount": 0,
+    "issues": {"licenses": [], "vulnerabilities": []},
+}
+
+
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(description="Manifest upload benchmark")
+    parser.add_argument(
+        "--size", type=int, default=50, help="The size of the lock file in MiB"
+    )
+    return parser.parse_args()
+
+
+def lockfile(size: int) -> bytes:
+    entry = b'"left-pad@^1.3.0":\n  version "1.3.0"\n  resolved "https://registry"\n'
+    return entry * (size * 1024 * 1024 // len(entry))
+
+
+def main():
+    args = parse_command_line_args()
+    org = Organization(name="Benchmark", id=ORG_ID, slug="benchmark", url="")
+    org.client = SnykClient("token")
+    contents = lockfile(args.size)
+
+    with requests_mock.Mocker() as mocker, tempfile.TemporaryDirectory() as tmp:
+        mocker.post(requests_mock.ANY, json=BLANK_TEST)
+        path = os.path.join(tmp, "yarn.lock")
+        with open(path, "wb") as the_file:
+            the_file.write(contents)
+
+        print("Testing a %s MiB yarn.lock\n" % args.size)
+
+        text = contents.decode()
+        _, elapsed, peak = measure(lambda: org.test_yarn("{}", text))
+        report("str", elapsed, peak)
+        del text
+
+        _, elapsed, peak = measure(lambda: org.test_yarn("{}", contents))
+        report("bytes", elapsed, peak)
+        del contents
+
+        with open(path, "rb") as the_file:
+            with mmap.mmap(the_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                _, elapsed, peak = measure(lambda: org.test_yarn("{}", mapped))
+                report("mmap", elapsed, peak)
+
+
+if __name__ == "__main__":
+    main()
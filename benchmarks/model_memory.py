@@ -0,0 +1,143 @@
+"""
+Measures the memory used by the models created in large numbers, such as
+vulnerabilities and dependency graph nodes, by creating many of each from
+dictionaries. Each slotted model is compared with an equivalent dataclass
+which keeps its fields in a __dict__, as the models did before.
+
+    python benchmarks/model_memory.py --count 100000
+"""
+
+import argparse
+import dataclasses
+
+from mashumaro.mixins.json import DataClassJSONMixin  # type: ignore
+from utils import measure
+
+from snyk.models import (
+    AggregatedIssue,
+    Dependency,
+    DependencyGraphPackage,
+    FixInfo,
+    IssueData,
+    Node,
+    Vulnerability,
+)
+
+SAMPLES = {
+    Vulnerability: {
+        "id": "npm:ms:20170412",
+        "url": "https://security.snyk.io/vuln/npm:ms:20170412",
+        "title": "Regular Expression Denial of Service (ReDoS)",
+        "description": "",
+        "upgradePath": ["tap@11.1.5", "ms@2.0.0"],
+        "package": "ms",
+        "version": "1.0.0",
+        "severity": "low",
+        "exploitMaturity": "no-known-exploit",
+        "isUpgradable": True,
+        "isPatchable": False,
+        "isPinnable": False,
+        "identifiers": {"CVE": [], "CWE": ["CWE-400"]},
+        "semver": {"vulnerable": ">=0.7.1 <2.0.0"},
+    },
+    AggregatedIssue: {
+        "id": "npm:ms:20170412",
+        "issueType": "vuln",
+        "pkgName": "ms",
+        "pkgVersions": ["1.0.0"],
+        "issueData": {
+            "id": "npm:ms:20170412",
+            "title": "Regular Expression Denial of Service (ReDoS)",
+            "severity": "low",
+            "url": "https://security.snyk.io/vuln/npm:ms:20170412",
+            "exploitMaturity": "no-known-exploit",
+        },
+        "isPatched": False,
+        "isIgnored": False,
+        "fixInfo": {
+            "isUpgradable": True,
+            "isPinnable": False,
+            "isPatchable": False,
+            "isFixable": True,
+            "isPartiallyFixable": False,
+            "nearestFixedInVersion": "2.0.0",
+        },
+    },
+    IssueData: {
+        "id": "npm:ms:20170412",
+        "title": "Regular Expression Denial of Service (ReDoS)",
+        "severity": "low",
+        "url": "https://security.snyk.io/vuln/npm:ms:20170412",
+        "exploitMaturity": "no-known-exploit",
+    },
+    FixInfo: {
+        "isUpgradable": True,
+        "isPinnable": False,
+        "isPatchable": False,
+        "isFixable": True,
+        "isPartiallyFixable": False,
+        "nearestFixedInVersion": "2.0.0",
+    },
+    Dependency: {
+        "id": "ms@1.0.0",
+        "name": "ms",
+        "version": "1.0.0",
+        "licenses": [],
+        "projects": [],
+    },
+    Node: {"nodeId": "ms@1.0.0", "pkgId": "ms@1.0.0", "deps": []},
+    DependencyGraphPackage: {
+        "id": "ms@1.0.0",
+        "info": {"name": "ms", "version": "1.0.0"},
+    },
+}
+
+
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(description="Model memory benchmark")
+    parser.add_argument(
+        "--count", type=int, default=100000, help="The number of each model to create"
+    )
+    return parser.parse_args()
+
+
+def unslotted(klass):
+    """
+    Returns a copy of the model which keeps its fields in a __dict__
+    """
+    namespace = {
+        "__annotations__": dict(klass.__annotations__),
+        "__module__": klass.__module__,
+        "__qualname__": klass.__qualname__,
+    }
+    for field in dataclasses.fields(klass):
+        if field.default is not dataclasses.MISSING:
+            namespace[field.name] = field.default
+        elif field.default_factory is not dataclasses.MISSING:
+            namespace[field.name] = dataclasses.field(
+                default_factory=field.default_factory
+            )
+    return dataclasses.dataclass(type(klass.__name__, (DataClassJSONMixin,), namespace))
+
+
+def per_object(klass, data, count):
+    models, _, peak = measure(lambda: [klass.from_dict(data) for _ in range(count)])
+    del models
+    return peak / count
+
+
+def main():
+    args = parse_command_line_args()
+    print("Bytes per model, averaged over %s models\n" % args.count)
+    print("%-24s %10s %10s %8s" % ("Model", "__dict__", "__slots__", "Saving"))
+    for klass, data in SAMPLES.items():
+        before = per_object(unslotted(klass), data, args.count)
+        after = per_object(klass, data, args.count)
+        print(
+            "%-24s %10.0f %10.0f %7.0f%%"
+            % (klass.__name__, before, after, 100 * (1 - after / before))
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+
+def measure(fn: Callable[[], Any]) -> Tuple[Any, float, int]:
+    """
+    Calls fn, returning its result, the time it took in seconds and the peak
+    memory allocated by Python while it ran, in bytes
+    """
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def report(name: str, elapsed: float, peak: int) -> None:
+    print("%-32s %8.3fs %10.1f MiB peak" % (name, elapsed, peak / 1024 / 1024))
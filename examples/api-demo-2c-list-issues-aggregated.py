@@ -57,7 +57,7 @@ def output_excel(vulns, output_path):
 
 
 client = SnykClient(snyk_token)
-issue_set = client.organizations.get(org_id).projects.get(project_id).issueset_aggregated.all()
+issue_set = client.organizations.get(org_id).projects.get(project_id).issueset_aggregated.all(lazy=True)
 
 lst_output = []
 for v in issue_set.issues:
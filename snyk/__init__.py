@@ -20,4 +20,5 @@ or package manifests.
 """
 
 from .__version__ import __description__, __license__, __title__, __url__, __version__
+from .async_client import AsyncSnykClient
 from .client import SnykClient
@@ -0,0 +1,251 @@
+import abc
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from .client import SnykClient
+from .errors import SnykError, SnykNotFoundError, SnykNotImplementedError
+from .managers import Manager
+from .models import Organization, Project
+from .views import ModelView
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSnykClient(object):
+    """
+    Asyncio counterpart to SnykClient.
+
+    Requests are sent through a SnykClient, and its pooled session, on a
+    bounded pool of worker threads so that up to `concurrency` requests can be
+    in flight at once without blocking the event loop. Any other keyword
+    arguments are passed through to SnykClient.
+
+    The models returned by the async managers are the same classes returned by
+    the synchronous client, and are bound to the underlying SnykClient.
+    """
+
+    def __init__(self, token: str, concurrency: int = 10, **kwargs: Any):
+        # Size the connection pool to match the number of workers, so that no
+        # connection is thrown away when every worker is busy
+        kwargs.setdefault("pool_maxsize", concurrency)
+        self.client = SnykClient(token, **kwargs)
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def _run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def post(self, path: str, body: Any, headers: dict = {}) -> requests.Response:
+        return await self._run(self.client.post, path, body, headers)
+
+    async def put(self, path: str, body: Any, headers: dict = {}) -> requests.Response:
+        return await self._run(self.client.put, path, body, headers)
+
+    async def get(
+        self,
+        path: str,
+        params: dict = None,
+        version: str = None,
+        exclude_version: bool = False,
+        exclude_params: bool = False,
+    ) -> requests.Response:
+        return await self._run(
+            self.client.get,
+            path,
+            params,
+            version=version,
+            exclude_version=exclude_version,
+            exclude_params=exclude_params,
+        )
+
+    async def delete(self, path: str) -> requests.Response:
+        return await self._run(self.client.delete, path)
+
+    async def get_rest_pages(self, path: str, params: dict = {}) -> List:
+        return await self._run(self.client.get_rest_pages, path, params)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+    async def __aenter__(self) -> "AsyncSnykClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        # close() waits for the workers to finish, so it mustn't block the loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    @property
+    def organizations(self) -> "AsyncManager":
+        return AsyncManager.factory(Organization, self)
+
+    @property
+    def projects(self) -> "AsyncManager":
+        return AsyncManager.factory(Project, self)
+
+
+class AsyncManager(abc.ABC):
+    """
+    Awaitable equivalent of snyk.managers.Manager.
+
+    The synchronous manager for the same class is kept alongside so that the
+    code which turns API responses into models is shared between the two.
+    """
+
+    def __init__(self, klass, client, instance=None):
+        self.klass = klass
+        self.client = client
+        self.instance = instance
+        self._manager = Manager.factory(klass, client.client, instance)
+
+    @abc.abstractmethod
+    async def all(self):
+        pass  # pragma: no cover
+
+    async def get(self, id: str):
+        try:
+            return next(x for x in await self.all() if x.id == id)
+        except StopIteration:
+            raise SnykNotFoundError
+
+    async def first(self):
+        try:
+            return (await self.all())[0]
+        except IndexError:
+            raise SnykNotFoundError
+
+    async def filter(self, **kwargs: Any):
+        return self._manager._filter_by_kwargs(await self.all(), **kwargs)
+
+    @staticmethod
+    def factory(klass, client, instance=None):
+        try:
+            if isinstance(klass, str):
+                key = klass
+            else:
+                key = klass.__name__
+            manager = {
+                "Project": AsyncProjectManager,
+                "Organization": AsyncOrganizationManager,
+                "IssueSetAggregated": AsyncIssueSetAggregatedManager,
+                "IssuePaths": AsyncIssuePathsManager,
+            }[key]
+            return manager(klass, client, instance)
+        except KeyError:
+            raise SnykError
+
+
+class AsyncSingletonManager(AsyncManager):
+    async def first(self):
+        raise SnykNotImplementedError  # pragma: no cover
+
+    async def get(self, id: str):
+        raise SnykNotImplementedError  # pragma: no cover
+
+    async def filter(self, **kwargs: Any):
+        raise SnykNotImplementedError  # pragma: no cover
+
+
+class AsyncOrganizationManager(AsyncManager):
+    async def all(self):
+        resp = await self.client.get("orgs")
+        return self._manager._orgs_from_data(resp.json())
+
+
+class AsyncProjectManager(AsyncManager):
+    async def _query(
+        self, tags: List[Dict[str, str]] = [], filters: Dict[str, Any] = {}
+    ):
+        projects = []
+        if self.instance:
+            request: Optional[Dict[str, Any]] = self._manager._first_page_request(
+                tags, filters=filters
+            )
+            while request is not None:
+                page_data = (await self.client.get(**request)).json()
+                if "data" not in page_data:
+                    break
+                projects.extend(
+                    self._manager._filter_by_kwargs(
+                        self._manager._projects_from_page(page_data), **filters
+                    )
+                )
+                request = self._manager._next_page_request(page_data)
+        else:
+            # Each organization is listed concurrently, bounded by the
+            # number of workers available to the client. As with the synchronous
+            # manager, an organization which fails is recorded in self.errors
+            # rather than failing the whole listing.
+            self._manager.errors = {}
+            orgs = await self.client.organizations.all()
+            results = await asyncio.gather(
+                *[
+                    AsyncManager.factory(Project, self.client, org)._query(
+                        tags, filters
+                    )
+                    for org in orgs
+                ],
+                return_exceptions=True,
+            )
+            for org, org_projects in zip(orgs, results):
+                if isinstance(org_projects, Exception):
+                    logger.warning(
+                        "Failed to list the projects of organization %s: %s",
+                        org.id,
+                        org_projects,
+                    )
+                    self._manager.errors[org.id] = org_projects
+                elif isinstance(org_projects, BaseException):
+                    raise org_projects
+                else:
+                    projects.extend(org_projects)
+        return projects
+
+    @property
+    def errors(self) -> Dict[str, Exception]:
+        return self._manager.errors
+
+    async def all(self):
+        return await self._query()
+
+    async def filter(self, tags: List[Dict[str, str]] = [], **kwargs: Any):
+        return await self._query(tags, kwargs)
+
+    async def first(self):
+        # Only the first small page of each organization is needed, so this
+        # is left to the synchronous manager on a worker thread
+        return await self.client._run(self._manager.first)
+
+    async def get(self, id: str):
+        if self.instance:
+            path = "org/%s/project/%s" % (self.instance.id, id)
+            resp = await self.client.get(path)
+            return self._manager._project_from_v1(resp.json())
+        else:
+            return await super().get(id)
+
+
+class AsyncIssueSetAggregatedManager(AsyncSingletonManager):
+    async def all(self, lazy: bool = False) -> Any:
+        return await self.filter(lazy=lazy)
+
+    async def filter(self, lazy: bool = False, **kwargs: Any):
+        path, post_body = self._manager._filter_request(**kwargs)
+        resp = await self.client.post(path, post_body)
+        if lazy:
+            return ModelView(self.klass, resp.json())
+        return self.klass.from_dict(resp.json())
+
+
+class AsyncIssuePathsManager(AsyncSingletonManager):
+    async def all(self):
+        resp = await self.client.get(self._manager._path())
+        return self.klass.from_dict(resp.json())
@@ -0,0 +1,209 @@
+import abc
+import base64
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .errors import SnykError
+
+
+class Cache(abc.ABC):
+    """
+    A key/value store used by the client to keep responses between requests.
+    Entries older than ttl seconds are treated as missing, and once more than
+    maxsize entries are stored the least recently used are evicted.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    def _expires(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl is not None else None
+
+    @staticmethod
+    def _expired(expires: Optional[float]) -> bool:
+        return expires is not None and expires <= time.time()
+
+    @abc.abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        pass  # pragma: no cover
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        pass  # pragma: no cover
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        pass  # pragma: no cover
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        pass  # pragma: no cover
+
+
+class MemoryCache(Cache):
+    """
+    A thread safe, in-memory, least recently used cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        super().__init__(maxsize, ttl)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                expires, value = self._entries[key]
+            except KeyError:
+                return default
+            if self._expired(expires):
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (self._expires(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _encode_bytes(value: Any) -> Dict[str, str]:
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"{type(value).__name__} can't be stored in a DiskCache")
+
+
+def _decode_bytes(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and "__bytes__" in value:
+        return base64.b64decode(value["__bytes__"])
+    return value
+
+
+class DiskCache(Cache):
+    """
+    A cache which stores each entry as JSON in its own file in directory, so that
+    entries survive between processes. Values may be made of anything JSON can
+    represent, and bytes. The modification time of each file is updated when it is
+    read, and the least recently used files are removed once there are more than
+    maxsize of them.
+
+    Cached responses may contain private data, so the directory is created
+    readable only by the current user, and a directory owned by another user or
+    writable by others is refused.
+    """
+
+    SUFFIX = ".pysnyk-cache"
+
+    def __init__(
+        self, directory: str, maxsize: int = 1024, ttl: Optional[float] = None
+    ):
+        super().__init__(maxsize, ttl)
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._check_directory()
+        self._lock = threading.Lock()
+
+    def _check_directory(self) -> None:
+        info = os.stat(self.directory)
+        if hasattr(os, "getuid") and info.st_uid != os.getuid():
+            raise SnykError(
+                f"Cache directory {self.directory} is owned by another user"
+            )
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise SnykError(
+                f"Cache directory {self.directory} is writable by other users"
+            )
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, name + self.SUFFIX)
+
+    def _files(self):
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(self.SUFFIX)
+        ]
+
+    @staticmethod
+    def _last_used(path: str) -> float:
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return 0.0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as the_file:
+                entry = json.load(the_file, object_hook=_decode_bytes)
+            expires, value = entry["expires"], entry["value"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return default
+        if self._expired(expires):
+            self.delete(key)
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        data = json.dumps(
+            {"expires": self._expires(), "value": value}, default=_encode_bytes
+        )
+        # Write to a temporary file first, so that readers never see a partial entry
+        temp_path = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as the_file:
+            the_file.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            files = self._files()
+            if len(files) > self.maxsize:
+                files.sort(key=self._last_used)
+                for name in files[: len(files) - self.maxsize]:
+                    try:
+                        os.remove(name)
+                    except OSError:
+                        pass
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        for name in self._files():
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._files())
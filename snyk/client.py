@@ -1,20 +1,51 @@
+import hashlib
 import logging
+import random
+import threading
+import time
 import urllib.parse
-from typing import Any, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
 from urllib.parse import parse_qs, urlparse
 
 import requests
-from retry.api import retry_call
+from requests.adapters import HTTPAdapter
 
 from .__version__ import __version__
-from .errors import SnykHTTPError, SnykNotImplementedError
+from .cache import Cache, MemoryCache
+from .errors import SnykHTTPError, SnykNotImplementedError, SnykRateLimitError
 from .managers import Manager
 from .models import Organization, Project
-from .utils import cleanup_path
+from .utils import SingleFlight, cleanup_path, get_json_decoder, prefetch_iter
 
 logger = logging.getLogger(__name__)
 
 
+class SnykResponse(requests.Response):
+    """
+    A response which keeps the result of decoding its body as JSON. The result is
+    kept in an attribute rather than in a closure over the response, so the
+    response isn't part of a reference cycle and its body is freed as soon as it
+    is no longer used.
+    """
+
+    _json_loads: Callable[[bytes], Any]
+
+    def json(self, **kwargs: Any) -> Any:
+        # Options for the json module can only be honoured by requests itself
+        if kwargs:
+            return super().json(**kwargs)
+        try:
+            return self.__dict__["_decoded_json"]
+        except KeyError:
+            pass
+        try:
+            decoded = self._json_loads(self.content)
+        except ValueError as e:
+            raise requests.exceptions.JSONDecodeError(str(e), self.text, 0)
+        self.__dict__["_decoded_json"] = decoded
+        return decoded
+
+
 class SnykClient(object):
     API_URL = "https://api.snyk.io/v1"
     REST_API_URL = "https://api.snyk.io/rest"
@@ -30,8 +61,17 @@ class SnykClient(object):
         tries: int = 1,
         delay: int = 1,
         backoff: int = 2,
+        jitter: float = 0.1,
         verify: bool = True,
         version: Optional[str] = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        session: Optional[requests.Session] = None,
+        json_decoder: Union[str, Callable[[bytes], Any]] = "json",
+        cache: Optional[Cache] = None,
+        single_flight: bool = False,
+        manifest_cache: Optional[Cache] = None,
     ):
         self.api_token = token
         self.api_url = url or self.API_URL
@@ -45,8 +85,15 @@ class SnykClient(object):
         self.tries = tries
         self.backoff = backoff
         self.delay = delay
+        self.jitter = jitter
         self.verify = verify
         self.version = version
+        # Either the name of a decoder backend, or a function to decode JSON
+        # from the bytes of a response body
+        if callable(json_decoder):
+            self.json_loads = json_decoder
+        else:
+            self.json_loads = get_json_decoder(json_decoder)
 
         # Ensure we don't have a trailing /
         if self.api_url[-1] == "/":
@@ -54,9 +101,70 @@ class SnykClient(object):
         if self.rest_api_url[-1] == "/":
             self.rest_api_url = self.rest_api_url.rstrip("/")
 
+        # A single session is shared by every request made through the client
+        # so that connections are pooled and kept alive between API calls
+        # rather than paying for a new TCP and TLS handshake each time.
+        # pool_connections is the number of hosts to keep pools for and
+        # pool_maxsize the number of connections kept open per host.
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+        # Successful GET responses which carry an ETag or Last-Modified header
+        # are kept here and revalidated with a conditional request next time.
+        # Keys are namespaced by token, as a cache on disk may be shared.
+        self.cache = cache
+        self._cache_namespace = hashlib.sha256(token.encode()).hexdigest()[:16]
+
+        # When enabled, concurrent GETs for the same url, params and version are
+        # coalesced into a single request whose response, including its decoded
+        # JSON, is shared by every caller. Treat shared results as read only.
+        self._single_flight = SingleFlight() if single_flight else None
+
+        # Results of testing manifest files, keyed by test path and the SHA-256 of
+        # the files, so byte identical manifests are only tested once
+        self.manifest_cache = manifest_cache
+
+        # Users looked up for projects, by organization and user id. A handful of
+        # users usually own most projects, so they're kept for a few minutes.
+        self.user_cache: Cache = MemoryCache(ttl=300)
+
+        # Results of Organization.test_packages, by organization and package. Most
+        # packages tested repeatedly are unchanged, so results are kept for an hour.
+        self.package_test_cache: Cache = MemoryCache(maxsize=16384, ttl=3600)
+
+        # Objects listed by managers without a single resource endpoint, by id,
+        # so that repeated calls to get() don't list the whole collection again.
+        # Listings are kept for a minute; clear the cache to see changes sooner.
+        self.listing_cache: Cache = MemoryCache(maxsize=256, ttl=60)
+
+        # Time spent waiting on rate limited (429) responses before retrying
+        self.throttled_requests = 0
+        self.throttled_seconds = 0.0
+        self._throttle_lock = threading.Lock()
+
         if debug:
             logging.basicConfig(level=logging.DEBUG)
 
+    def close(self) -> None:
+        """
+        Closes the underlying session, releasing any pooled connections
+        """
+        self.session.close()
+
+    def __enter__(self) -> "SnykClient":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
     def request(
         self,
         method,
@@ -64,37 +172,90 @@ class SnykClient(object):
         headers: object,
         params: object = None,
         json: object = None,
+        data: object = None,
     ) -> requests.Response:
 
-        if params and json:
-            resp = method(
-                url, headers=headers, params=params, json=json, verify=self.verify
-            )
-        elif params and not json:
-            resp = method(url, headers=headers, params=params, verify=self.verify)
-        elif json and not params:
-            resp = method(url, headers=headers, json=json, verify=self.verify)
-        else:
-            resp = method(url, headers=headers, verify=self.verify)
-
-        if not resp or resp.status_code >= requests.codes.server_error:
+        kwargs: Dict[str, Any] = {}
+        if params:
+            kwargs["params"] = params
+        if json:
+            kwargs["json"] = json
+        if data is not None:
+            kwargs["data"] = data
+        resp = method(url, headers=headers, verify=self.verify, **kwargs)
+
+        self._decode_json_once(resp)
+
+        if resp.status_code == requests.codes.too_many_requests:
+            logger.warning(f"Rate limited: {resp.text}")
+            raise SnykRateLimitError(resp)
+        if resp.status_code >= requests.codes.server_error:
             logger.warning(f"Retrying: {resp.text}")
             raise SnykHTTPError(resp)
         return resp
 
-    def post(self, path: str, body: Any, headers: dict = {}) -> requests.Response:
+    def _decode_json_once(self, resp: requests.Response) -> None:
+        """
+        Makes the response a SnykResponse, whose json method decodes the body with
+        the client's decoder the first time it is called and returns the same
+        result after that, so that callers can call resp.json() freely.
+        """
+        resp.__class__ = SnykResponse
+        setattr(resp, "_json_loads", self.json_loads)
+
+    def _retry_request(
+        self, method, url: str, exceptions: Any = Exception, **kwargs: Any
+    ) -> requests.Response:
+        """
+        Calls request, retrying up to the configured number of tries.
+
+        Rate limited responses wait for as long as the server asks for in the
+        Retry-After header, while other failures back off exponentially from
+        the configured delay. Both have up to `jitter` (a fraction of the wait)
+        added, so that concurrent workers don't all retry at the same moment.
+        """
+        tries, delay = self.tries, self.delay
+        while True:
+            try:
+                return self.request(method, url, **kwargs)
+            except exceptions as e:
+                tries -= 1
+                if not tries:
+                    raise
+
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None:
+                    wait = retry_after
+                else:
+                    wait = delay
+                    delay *= self.backoff
+                wait += random.uniform(0, wait * self.jitter)
+
+                if isinstance(e, SnykRateLimitError):
+                    with self._throttle_lock:
+                        self.throttled_requests += 1
+                        self.throttled_seconds += wait
+
+                logger.warning(f"{e!r}, retrying in {wait:.2f} seconds...")
+                time.sleep(wait)
+
+    def post(
+        self, path: str, body: Any, headers: dict = {}, data: Any = None
+    ) -> requests.Response:
+        """
+        Posts body encoded as JSON. Alternatively, data is sent as the request body
+        as it is, such as JSON which has already been encoded to bytes.
+        """
         url = f"{self.api_url}/{path}"
         logger.debug(f"POST: {url}")
 
-        resp = retry_call(
-            self.request,
-            fargs=[requests.post, url],
-            fkwargs={"json": body, "headers": {**self.api_post_headers, **headers}},
-            tries=self.tries,
-            delay=self.delay,
-            backoff=self.backoff,
+        resp = self._retry_request(
+            self.session.post,
+            url,
             exceptions=SnykHTTPError,
-            logger=logger,
+            json=body,
+            data=data,
+            headers={**self.api_post_headers, **headers},
         )
 
         if not resp.ok:
@@ -107,14 +268,11 @@ class SnykClient(object):
         url = "%s/%s" % (self.api_url, path)
         logger.debug("PUT: %s" % url)
 
-        resp = retry_call(
-            self.request,
-            fargs=[requests.put, url],
-            fkwargs={"json": body, "headers": {**self.api_post_headers, **headers}},
-            tries=self.tries,
-            delay=self.delay,
-            backoff=self.backoff,
-            logger=logger,
+        resp = self._retry_request(
+            self.session.put,
+            url,
+            json=body,
+            headers={**self.api_post_headers, **headers},
         )
         if not resp.ok:
             logger.error(resp.text)
@@ -181,51 +339,117 @@ class SnykClient(object):
 
         logger.debug(f"GET: {debug_url}")
 
-        resp = retry_call(
-            self.request,
-            fargs=[requests.get, url],
-            fkwargs=fkwargs,
-            tries=self.tries,
-            delay=self.delay,
-            backoff=self.backoff,
-            logger=logger,
-        )
+        if self._single_flight is not None:
+            key = self._cache_key(url, fkwargs.get("params"))
+            return self._single_flight.do(
+                key, lambda: self._get(url, fkwargs, debug_url)
+            )
+        return self._get(url, fkwargs, debug_url)
+
+    def _get(self, url: str, fkwargs: dict, debug_url: str) -> requests.Response:
+        cache_key, cached = None, None
+        if self.cache is not None:
+            cache_key = self._cache_key(url, fkwargs.get("params"))
+            cached = self.cache.get(cache_key)
+            if cached:
+                fkwargs = {
+                    **fkwargs,
+                    "headers": {**fkwargs["headers"], **cached["validators"]},
+                }
+
+        resp = self._retry_request(self.session.get, url, **fkwargs)
         if not resp.ok:
             logger.error(resp.text)
             raise SnykHTTPError(resp)
 
+        if cache_key is not None:
+            if cached and resp.status_code == requests.codes.not_modified:
+                logger.debug(f"GET: {debug_url} not modified, using cached response")
+                resp = self._cached_response(cached, resp)
+            self._cache_response(cache_key, resp)
+
+        return resp
+
+    def _cache_key(self, url: str, params: Optional[dict]) -> str:
+        prepared = requests.Request("GET", url, params=params).prepare()
+        return f"{self._cache_namespace}:{prepared.url}"
+
+    def _cache_response(self, key: str, resp: requests.Response) -> None:
+        validators = {}
+        if "ETag" in resp.headers:
+            validators["If-None-Match"] = resp.headers["ETag"]
+        if "Last-Modified" in resp.headers:
+            validators["If-Modified-Since"] = resp.headers["Last-Modified"]
+        if not validators or self.cache is None:
+            return
+
+        self.cache.set(
+            key,
+            {
+                "validators": validators,
+                "status_code": resp.status_code,
+                "headers": dict(resp.headers),
+                "content": resp.content,
+                "encoding": resp.encoding,
+                "url": resp.url,
+            },
+        )
+
+    def _cached_response(
+        self, cached: dict, not_modified: requests.Response
+    ) -> requests.Response:
+        """
+        Builds the response to return for a 304 from the cached copy of the body
+        """
+        resp = requests.Response()
+        resp.status_code = cached["status_code"]
+        resp.headers.update(cached["headers"])
+        # The server may send updated validators along with the 304
+        resp.headers.update(not_modified.headers)
+        resp._content = cached["content"]
+        resp.encoding = cached["encoding"]
+        resp.url = cached["url"]
+        resp.request = not_modified.request
+        resp.elapsed = not_modified.elapsed
+        self._decode_json_once(resp)
         return resp
 
     def delete(self, path: str) -> requests.Response:
         url = f"{self.api_url}/{path}"
         logger.debug(f"DELETE: {url}")
 
-        resp = retry_call(
-            self.request,
-            fargs=[requests.delete, url],
-            fkwargs={"headers": self.api_headers},
-            tries=self.tries,
-            delay=self.delay,
-            backoff=self.backoff,
-            logger=logger,
-        )
+        resp = self._retry_request(self.session.delete, url, headers=self.api_headers)
         if not resp.ok:
             logger.error(resp.text)
             raise SnykHTTPError(resp)
 
         return resp
 
-    def get_rest_pages(self, path: str, params: dict = {}) -> List:
+    def iter_rest_pages(
+        self, path: str, params: dict = {}, version: str = None, prefetch: int = 0
+    ) -> Iterator[List]:
         """
-        Helper function to collect paginated responses from the rest API into a single
-        list.
-
-        This collects the "data" list from the first response and then appends the
-        any further "data" lists if a next link is found in the links field.
+        Helper function to iterate over the pages of a paginated response from the
+        rest API, yielding the "data" list of each page as soon as it is decoded.
+
+        The first page is always yielded. Further pages are requested, one at a
+        time as the caller asks for them, while a next link is found in the links
+        field. Iteration stops when the next link points back at the current page,
+        or a page comes back without any data. Callers which stop iterating early
+        do not pay for the remaining pages.
+
+        With a prefetch depth, pages are fetched on a background thread up to that
+        many pages ahead of the caller, hiding request latency behind the time
+        spent processing each page.
         """
-        first_page_response = self.get(path, params)
+        return prefetch_iter(self._iter_rest_pages(path, params, version), prefetch)
+
+    def _iter_rest_pages(
+        self, path: str, params: dict = {}, version: str = None
+    ) -> Iterator[List]:
+        first_page_response = self.get(path, params, version=version)
         page_data = first_page_response.json()
-        return_data = page_data["data"]
+        yield page_data["data"]
 
         while page_data.get("links", {}).get("next"):
             logger.debug(
@@ -248,7 +472,11 @@ class SnykClient(object):
 
             # The next url comes back fully formed (i.e. with all the params already set, so no need to do it here)
             next_page_response = self.get(
-                next_url, {}, exclude_version=True, exclude_params=True
+                next_url,
+                {},
+                version=version,
+                exclude_version=True,
+                exclude_params=True,
             )
             page_data = next_page_response.json()
 
@@ -261,12 +489,30 @@ class SnykClient(object):
             else:
                 break
 
-            # Append the data from the next page to the return data
-            return_data.extend(page_data["data"])
             logger.debug(
-                f"GET_REST_PAGES: Added another {len(page_data['data'])} items to the response"
+                f"GET_REST_PAGES: Fetched another {len(page_data['data'])} items"
             )
-        return return_data
+            yield page_data["data"]
+
+    def iter_rest_items(
+        self, path: str, params: dict = {}, version: str = None, prefetch: int = 0
+    ) -> Iterator[Any]:
+        """
+        Helper function to iterate over the individual items in the "data" lists of
+        a paginated response from the rest API, fetching pages as they are needed.
+        """
+        for page in self.iter_rest_pages(path, params, version, prefetch):
+            yield from page
+
+    def get_rest_pages(self, path: str, params: dict = {}, prefetch: int = 0) -> List:
+        """
+        Helper function to collect paginated responses from the rest API into a single
+        list.
+
+        This collects the "data" list from the first response and then appends the
+        any further "data" lists if a next link is found in the links field.
+        """
+        return list(self.iter_rest_items(path, params, prefetch=prefetch))
 
     # alias for backwards compatibility where V3 was the old name
     get_v3_pages = get_rest_pages
@@ -2,6 +2,8 @@ import json
 
 import requests
 
+from .utils import parse_retry_after
+
 
 class SnykError(Exception):
     pass
@@ -19,6 +21,13 @@ class SnykHTTPError(SnykError):
                 self.code = resp.status_code
 
 
+class SnykRateLimitError(SnykHTTPError):
+    def __init__(self, resp: requests.Response):
+        super().__init__(resp)
+        self.code = resp.status_code
+        self.retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+
+
 class SnykNotFoundError(SnykError):
     pass
 
@@ -1,11 +1,17 @@
 import abc
 import json
-from typing import Any, Dict, List
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from deprecation import deprecated  # type: ignore
 
 from .errors import SnykError, SnykNotFoundError, SnykNotImplementedError
-from .utils import snake_to_camel
+from .utils import parallel_map, prefetch_iter, snake_to_camel
+from .views import ModelView
+
+logger = logging.getLogger(__name__)
 
 
 class Manager(abc.ABC):
@@ -18,10 +24,24 @@ class Manager(abc.ABC):
     def all(self):
         pass  # pragma: no cover
 
+    def _index_key(self) -> str:
+        return "%s/%s" % (self.klass.__name__, getattr(self.instance, "id", ""))
+
+    def _reindex(self) -> Dict[str, Any]:
+        index = {x.id: x for x in self.all()}
+        self.client.listing_cache.set(self._index_key(), index)
+        return index
+
     def get(self, id: str):
+        # The listing is indexed by id in the client's listing cache, so that
+        # only the first lookup, or a lookup for an id not seen before, makes a
+        # request until the listing expires
+        index = self.client.listing_cache.get(self._index_key())
+        if index is None or id not in index:
+            index = self._reindex()
         try:
-            return next(x for x in self.all() if x.id == id)
-        except StopIteration:
+            return index[id]
+        except KeyError:
             raise SnykNotFoundError
 
     def first(self):
@@ -30,6 +50,13 @@ class Manager(abc.ABC):
         except IndexError:
             raise SnykNotFoundError
 
+    def as_dicts(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the records listed by the API as dictionaries, without turning them
+        into models, for when they are only passed on elsewhere
+        """
+        raise SnykNotImplementedError  # pragma: no cover
+
     def _filter_by_kwargs(self, data, **kwargs: Any):
         if kwargs:
             for key, value in kwargs.items():
@@ -106,16 +133,23 @@ class SingletonManager(Manager):
 
 
 class OrganizationManager(Manager):
-    def all(self):
-        resp = self.client.get("orgs")
+    def _orgs_from_data(self, data: Dict[str, Any]) -> List[Any]:
         orgs = []
-        if "orgs" in resp.json():
-            for org_data in resp.json()["orgs"]:
+        if "orgs" in data:
+            for org_data in data["orgs"]:
                 orgs.append(self.klass.from_dict(org_data))
         for org in orgs:
             org.client = self.client
         return orgs
 
+    def all(self):
+        resp = self.client.get("orgs")
+        return self._orgs_from_data(resp.json())
+
+    def as_dicts(self) -> Iterator[Dict[str, Any]]:
+        resp = self.client.get("orgs")
+        yield from resp.json().get("orgs", [])
+
 
 class TagManager(Manager):
     def all(self):
@@ -139,6 +173,22 @@ class TagManager(Manager):
 
 
 class ProjectManager(Manager):
+    # Project attributes which the projects endpoint can filter on, and the
+    # query parameter each is sent as
+    FILTER_PARAMS = {
+        "id": "ids",
+        "name": "names",
+        "origin": "origins",
+        "type": "types",
+        "branch": "target_reference",
+    }
+
+    def __init__(self, klass, client, instance=None):
+        super().__init__(klass, client, instance)
+        # Errors raised while listing the projects of an organization, keyed by
+        # organization id, when projects are listed across all organizations
+        self.errors: Dict[str, Exception] = {}
+
     def _rest_to_v1_response_format(self, project):
         attributes = project.get("attributes", {})
         settings = attributes.get("settings", {})
@@ -190,123 +240,323 @@ class ProjectManager(Manager):
             .get("id"),
         }
 
-    def _query(self, tags: List[Dict[str, str]] = [], next_url: str = None):
+    def _query_params(
+        self,
+        tags: List[Dict[str, str]] = [],
+        limit: int = 100,
+        filters: Dict[str, Any] = {},
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"limit": limit}
+
+        # Push down any filters the API supports. The list parameters are comma
+        # separated, so values containing a comma are only filtered locally.
+        for key, value in filters.items():
+            param = self.FILTER_PARAMS.get(key)
+            if param is None or not isinstance(value, str):
+                continue
+            if "," in value and param != "target_reference":
+                continue
+            params[param] = value
+
+        # Append to params if we've got tags
+        if tags:
+            for tag in tags:
+                if "key" not in tag or "value" not in tag or len(tag.keys()) != 2:
+                    raise SnykError("Each tag must contain only a key and a value")
+            data = [f'{d["key"]}:{d["value"]}' for d in tags]
+            params["tags"] = ",".join(data)
+
+        return params
+
+    def _projects_from_page(self, page_data: Dict[str, Any]) -> List[Any]:
         projects = []
-        params: dict = {"limit": 100}
+        for response_data in page_data["data"]:
+            project_data = self._rest_to_v1_response_format(response_data)
+            # Project.from_dict keeps an Organization as it is, so every project in
+            # the listing refers to this one instance
+            project_data["organization"] = self.instance
+            try:
+                project_data["attributes"]["_tags"] = project_data["attributes"]["tags"]
+                del project_data["attributes"]["tags"]
+            except KeyError:
+                pass
+            if not project_data.get("totalDependencies"):
+                project_data["totalDependencies"] = 0
+            projects.append(self.klass.from_dict(project_data))
+        return projects
+
+    def _project_from_v1(self, project_data: Dict[str, Any]):
+        # Copy, as the decoded response may be shared with other callers
+        project_data = dict(project_data)
+        project_data["organization"] = self.instance
+        # We move tags to _tags as a cache, to avoid the need for additional requests
+        # when working with tags. We want tags to be the manager
+        try:
+            project_data["_tags"] = project_data["tags"]
+            del project_data["tags"]
+        except KeyError:
+            pass
+        if project_data.get("totalDependencies") is None:
+            project_data["totalDependencies"] = 0
+        return self.klass.from_dict(project_data)
+
+    def _first_page_request(
+        self,
+        tags: List[Dict[str, str]] = [],
+        limit: int = 100,
+        filters: Dict[str, Any] = {},
+    ) -> Dict[str, Any]:
+        """
+        Returns the arguments to client.get for the first page of projects. The
+        async manager requests the same pages, so this and _next_page_request are
+        shared with it.
+        """
+        params = self._query_params(tags, limit, filters)
+
+        # The issue counts and target are only requested on the first page, the
+        # next links returned by the API carry them on to the following pages
+        params["meta.latest_issue_counts"] = "true"
+        params["expand"] = "target"
+
+        return {
+            "path": "/orgs/%s/projects" % self.instance.id,
+            "params": params,
+            "version": "2023-06-19",
+        }
+
+    @staticmethod
+    def _next_page_request(page_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Returns the arguments to client.get for the page after page_data, or None
+        if it is the last page
+        """
+        if "next" not in page_data.get("links", {}):
+            return None
+        # The next link already carries every parameter, and single valued
+        # parameters such as limit and target_reference are rejected by the API
+        # if sent twice
+        return {
+            "path": page_data["links"]["next"],
+            "version": "2023-06-19",
+            "exclude_version": True,
+            "exclude_params": True,
+        }
+
+    def _pages(
+        self,
+        tags: List[Dict[str, str]] = [],
+        limit: int = 100,
+        filters: Dict[str, Any] = {},
+    ) -> Iterator[Dict[str, Any]]:
+        request: Optional[Dict[str, Any]] = self._first_page_request(
+            tags, limit, filters
+        )
+        while request is not None:
+            page_data = self.client.get(**request).json()
+            if "data" not in page_data:
+                return
+            yield page_data
+            request = self._next_page_request(page_data)
+
+    def _across_organizations(
+        self, fn: Callable, concurrency: int, ordered: bool = False
+    ) -> Iterator:
+        """
+        Calls fn with each organization, up to concurrency at once, and yields the
+        items of each list returned as soon as it completes, or with ordered in the
+        order of the organizations. An error while listing one organization does
+        not stop the others: it is logged and kept in self.errors, keyed by
+        organization id.
+        """
+        self.errors = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        futures = {
+            executor.submit(fn, org): org for org in self.client.organizations.all()
+        }
+        try:
+            for future in futures if ordered else as_completed(futures):
+                org = futures[future]
+                try:
+                    items = future.result()
+                except Exception as e:
+                    logger.warning(
+                        "Failed to list the projects of organization %s: %s", org.id, e
+                    )
+                    self.errors[org.id] = e
+                    continue
+                yield from items
+        finally:
+            # Don't start listing any more organizations if the caller stops early
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter(
+        self,
+        tags: List[Dict[str, str]] = [],
+        prefetch: int = 0,
+        concurrency: int = 4,
+        **kwargs: Any,
+    ) -> Iterator:
+        """
+        Yields projects one at a time as each page of results is decoded, so only a
+        single page of projects is held in memory however large the organization.
+
+        Only projects whose attributes equal the given keyword arguments are
+        yielded. Those listed in FILTER_PARAMS are sent to the API so that fewer
+        projects are returned, the rest are compared locally.
+
+        Without an organization, up to concurrency organizations are listed at once
+        and the projects of each are yielded as soon as it completes. An error while
+        listing one organization does not stop the others: it is logged and kept in
+        self.errors, keyed by organization id.
+        """
         if self.instance:
-            path = "/orgs/%s/projects" % self.instance.id if not next_url else next_url
-
-            # Append to params if we've got tags
-            if tags:
-                for tag in tags:
-                    if "key" not in tag or "value" not in tag or len(tag.keys()) != 2:
-                        raise SnykError("Each tag must contain only a key and a value")
-                data = [f'{d["key"]}:{d["value"]}' for d in tags]
-                params["tags"] = ",".join(data)
-
-            # Append the issue count param to the params if this is the first page
-            if not next_url:
-                params["meta.latest_issue_counts"] = "true"
-                params["expand"] = "target"
-
-            # And lastly, make the API call
-            resp = self.client.get(
-                path,
-                version="2023-06-19",
-                params=params,
-                exclude_version=True if next_url else False,
+            pages = self._pages(tags, filters=kwargs)
+            for page_data in prefetch_iter(pages, prefetch):
+                projects = self._projects_from_page(page_data)
+                yield from self._filter_by_kwargs(projects, **kwargs)
+        else:
+            yield from self._across_organizations(
+                lambda org: list(org.projects.iter(tags, prefetch=prefetch, **kwargs)),
+                concurrency,
             )
 
-            if "data" in resp.json():
-                # Process projects in current response
-                for response_data in resp.json()["data"]:
-                    project_data = self._rest_to_v1_response_format(response_data)
-                    project_data["organization"] = self.instance.to_dict()
-                    try:
-                        project_data["attributes"]["_tags"] = project_data[
-                            "attributes"
-                        ]["tags"]
-                        del project_data["attributes"]["tags"]
-                    except KeyError:
-                        pass
-                    if not project_data.get("totalDependencies"):
-                        project_data["totalDependencies"] = 0
-                    projects.append(self.klass.from_dict(project_data))
-
-                # If we have another page, then process this page too
-                if "next" in resp.json().get("links", {}):
-                    next_url = resp.json().get("links", {})["next"]
-                    projects.extend(self._query(tags, next_url))
-
-            for x in projects:
-                x.organization = self.instance
+    def as_dicts(
+        self,
+        tags: List[Dict[str, str]] = [],
+        raw: bool = False,
+        prefetch: int = 0,
+        concurrency: int = 4,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields each project as a dictionary, in the form Project.from_dict accepts,
+        or with raw as the record returned by the REST API, without creating any
+        Project objects. Otherwise this behaves like iter.
+        """
+        if self.instance:
+            organization = {
+                key: value
+                for key, value in self.instance.to_dict().items()
+                if key != "client"
+            }
+            for page_data in prefetch_iter(self._pages(tags), prefetch):
+                for project in page_data["data"]:
+                    if raw:
+                        yield project
+                    else:
+                        project_data = self._rest_to_v1_response_format(project)
+                        project_data["organization"] = organization
+                        yield project_data
         else:
-            for org in self.client.organizations.all():
-                projects.extend(org.projects.all())
-        return projects
+            yield from self._across_organizations(
+                lambda org: list(org.projects.as_dicts(tags, raw, prefetch)),
+                concurrency,
+            )
 
-    def all(self):
-        return self._query()
+    def _query(
+        self,
+        tags: List[Dict[str, str]] = [],
+        prefetch: int = 0,
+        concurrency: int = 4,
+        filters: Dict[str, Any] = {},
+    ):
+        if self.instance:
+            return list(self.iter(tags, prefetch=prefetch, **filters))
+        # Unlike iter, which yields the projects of each organization as soon as
+        # it has been listed, keep the projects in the order of the organizations
+        return list(
+            self._across_organizations(
+                lambda org: org.projects._query(tags, prefetch, filters=filters),
+                concurrency,
+                ordered=True,
+            )
+        )
 
-    def filter(self, tags: List[Dict[str, str]] = [], **kwargs: Any):
-        if tags:
-            return self._filter_by_kwargs(self._query(tags), **kwargs)
-        else:
-            return super().filter(**kwargs)
+    def all(self, prefetch: int = 0, concurrency: int = 4):
+        """
+        Returns all the projects, optionally fetching up to prefetch pages ahead on
+        a background thread while earlier pages are turned into Project objects.
+        Without an organization, up to concurrency organizations are listed at once
+        and their projects are returned in the order of the organizations.
+        """
+        return self._query(prefetch=prefetch, concurrency=concurrency)
+
+    def filter(
+        self,
+        tags: List[Dict[str, str]] = [],
+        prefetch: int = 0,
+        concurrency: int = 4,
+        **kwargs: Any,
+    ):
+        return self._query(tags, prefetch, concurrency, kwargs)
+
+    def first(self):
+        """
+        Returns the first project, requesting the smallest page the API allows and
+        no further pages once a project has been found. Without an organization,
+        the organizations are tried in turn until one has a project.
+        """
+        if self.instance:
+            # 10 is the smallest limit accepted by the projects endpoint
+            for page_data in self._pages(limit=10):
+                projects = self._projects_from_page(page_data)
+                if projects:
+                    return projects[0]
+            raise SnykNotFoundError
+
+        for org in self.client.organizations.all():
+            try:
+                return org.projects.first()
+            except SnykNotFoundError:
+                continue
+        raise SnykNotFoundError
 
     def get(self, id: str):
         if self.instance:
             path = "org/%s/project/%s" % (self.instance.id, id)
             resp = self.client.get(path)
-            project_data = resp.json()
-            project_data["organization"] = self.instance.to_dict()
-            # We move tags to _tags as a cache, to avoid the need for additional requests
-            # when working with tags. We want tags to be the manager
-            try:
-                project_data["_tags"] = project_data["tags"]
-                del project_data["tags"]
-            except KeyError:
-                pass
-            if project_data.get("totalDependencies") is None:
-                project_data["totalDependencies"] = 0
-            project_klass = self.klass.from_dict(project_data)
-            project_klass.organization = self.instance
-            return project_klass
-        else:
-            return super().get(id)
+            return self._project_from_v1(resp.json())
+
+        # The projects of every organization are too many to keep in the listing
+        # cache, so look through them, stopping at the first match
+        for project in self.iter():
+            if project.id == id:
+                return project
+        raise SnykNotFoundError
 
 
 class MemberManager(Manager):
     def all(self):
+        return [self.klass.from_dict(x) for x in self.as_dicts()]
+
+    def as_dicts(self) -> Iterator[Dict[str, Any]]:
         path = "org/%s/members" % self.instance.id
         resp = self.client.get(path)
-        members = []
-        for member_data in resp.json():
-            members.append(self.klass.from_dict(member_data))
-        return members
+        yield from resp.json()
 
 
 class LicenseManager(Manager):
     def all(self):
+        return [self.klass.from_dict(x) for x in self.as_dicts()]
+
+    def as_dicts(self) -> Iterator[Dict[str, Any]]:
+        post_body: Dict[str, Dict[str, List[str]]]
         if hasattr(self.instance, "organization"):
             path = "org/%s/licenses" % self.instance.organization.id
             post_body = {"filters": {"projects": [self.instance.id]}}
         else:
             path = "org/%s/licenses" % self.instance.id
-            post_body: Dict[str, Dict[str, List[str]]] = {"filters": {}}
+            post_body = {"filters": {}}
 
         resp = self.client.post(path, post_body)
         license_data = resp.json()
-        licenses = []
         if "results" in license_data:
-            for license in license_data["results"]:
-                licenses.append(self.klass.from_dict(license))
-        return licenses
+            yield from license_data["results"]
 
 
 class DependencyManager(Manager):
-    def all(self, page: int = 1):
-        results_per_page = 1000
+    def _page(self, page: int, results_per_page: int) -> Dict[str, Any]:
         if hasattr(self.instance, "organization"):
             org_id = self.instance.organization.id
             post_body = {"filters": {"projects": [self.instance.id]}}
@@ -321,19 +571,41 @@ class DependencyManager(Manager):
         )
 
         resp = self.client.post(path, post_body)
-        dependency_data = resp.json()
+        return resp.json()
+
+    def all(self, page: int = 1, concurrency: int = 4):
+        """
+        Returns the dependencies from the given page onwards. The first page tells us
+        how many pages there are, so the remaining pages are then fetched with up to
+        concurrency requests in flight and reassembled in order.
+        """
+        return [self.klass.from_dict(x) for x in self.as_dicts(page, concurrency)]
+
+    def as_dicts(self, page: int = 1, concurrency: int = 4) -> Iterator[Dict[str, Any]]:
+        results_per_page = 1000
+        dependency_data = self._page(page, results_per_page)
 
         total = dependency_data[
             "total"
         ]  # contains the total number of results (for pagination use)
+        last_page = math.ceil(total / results_per_page)
 
-        results = [self.klass.from_dict(item) for item in dependency_data["results"]]
+        yield from dependency_data["results"]
 
-        if total > (page * results_per_page):
-            next_results = self.all(page + 1)
-            results.extend(next_results)
+        next_pages = parallel_map(
+            lambda next_page: self._page(next_page, results_per_page),
+            range(page + 1, last_page + 1),
+            concurrency,
+        )
+        for page_data in next_pages:
+            yield from page_data["results"]
 
-        return results
+    def first(self):
+        # Only ask for a single result, rather than every page
+        try:
+            return self.klass.from_dict(self._page(1, 1)["results"][0])
+        except IndexError:
+            raise SnykNotFoundError
 
 
 class EntitlementManager(DictManager):
@@ -423,8 +695,9 @@ class IntegrationManager(Manager):
     def all(self):
         path = "org/%s/integrations" % self.instance.id
         resp = self.client.get(path)
+        data = resp.json()
         integrations = []
-        integrations_data = [{"name": x, "id": resp.json()[x]} for x in resp.json()]
+        integrations_data = [{"name": x, "id": data[x]} for x in data]
         for data in integrations_data:
             integrations.append(self.klass.from_dict(data))
         for integration in integrations:
@@ -490,10 +763,10 @@ class IssueSetManager(SingletonManager):
 
 
 class IssueSetAggregatedManager(SingletonManager):
-    def all(self) -> Any:
-        return self.filter()
+    def all(self, lazy: bool = False) -> Any:
+        return self.filter(lazy=lazy)
 
-    def filter(self, **kwargs: Any):
+    def _filter_request(self, **kwargs: Any) -> Tuple[str, Dict[str, Any]]:
         path = "org/%s/project/%s/aggregated-issues" % (
             self.instance.organization.id,
             self.instance.id,
@@ -521,16 +794,38 @@ class IssueSetAggregatedManager(SingletonManager):
             if optional_field in kwargs.keys():
                 post_body[optional_field] = kwargs[optional_field]
 
+        return path, post_body
+
+    def filter(self, lazy: bool = False, **kwargs: Any):
+        """
+        Returns the aggregated issues matching the filters. With lazy, a ModelView
+        is returned instead, which only builds the fields of each issue as they are
+        read.
+        """
+        path, post_body = self._filter_request(**kwargs)
         resp = self.client.post(path, post_body)
+        if lazy:
+            return ModelView(self.klass, resp.json())
         return self.klass.from_dict(resp.json())
 
+    def as_dicts(self, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Yields each aggregated issue matching the filters as a dictionary, without
+        creating any AggregatedIssue objects
+        """
+        path, post_body = self._filter_request(**kwargs)
+        resp = self.client.post(path, post_body)
+        yield from resp.json().get("issues", [])
+
 
 class IssuePathsManager(SingletonManager):
-    def all(self):
-        path = "org/%s/project/%s/issue/%s/paths" % (
+    def _path(self) -> str:
+        return "org/%s/project/%s/issue/%s/paths" % (
             self.instance.organization_id,
             self.instance.project_id,
             self.instance.id,
         )
-        resp = self.client.get(path)
+
+    def all(self):
+        resp = self.client.get(self._path())
         return self.klass.from_dict(resp.json())
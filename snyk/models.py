@@ -1,7 +1,21 @@
-import base64
+import binascii
+import hashlib
+import logging
+import math
+import mmap
 import re
 from dataclasses import InitVar, dataclass, field
-from typing import Any, Dict, List, Optional, Union
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import requests
 from deprecation import deprecated  # type: ignore
@@ -9,9 +23,12 @@ from mashumaro.mixins.json import DataClassJSONMixin  # type: ignore
 
 from .errors import SnykError, SnykNotImplementedError
 from .managers import Manager
-from .utils import flat_map, format_package
+from .utils import format_package, parallel_map, slotted
 
+logger = logging.getLogger(__name__)
 
+
+@slotted
 @dataclass
 class Vulnerability(DataClassJSONMixin):
     id: str
@@ -75,6 +92,7 @@ class IssueSet(DataClassJSONMixin):
     issues: Issue
 
 
+@slotted
 @dataclass
 class IssueData(DataClassJSONMixin):
     id: str
@@ -97,6 +115,7 @@ class IssueData(DataClassJSONMixin):
     ignoreReasons: Optional[List[Any]] = None
 
 
+@slotted
 @dataclass
 class FixInfo(DataClassJSONMixin):
     isUpgradable: bool
@@ -108,6 +127,7 @@ class FixInfo(DataClassJSONMixin):
     fixedIn: Optional[List[str]] = None
 
 
+@slotted
 @dataclass
 class AggregatedIssue(DataClassJSONMixin):
     id: str
@@ -126,6 +146,52 @@ class AggregatedIssue(DataClassJSONMixin):
     priority: Optional[Any] = None
 
 
+@slotted
+@dataclass
+class VulnerableVersion(DataClassJSONMixin):
+    """
+    One version of a package affected by an aggregated issue. Every version of the
+    package refers to the same issue and upgrade path rather than a copy of them,
+    so they should be treated as read only. to_vulnerability() builds the
+    equivalent Vulnerability.
+    """
+
+    issue: AggregatedIssue
+    version: str
+    upgradePath: List[str] = field(default_factory=list)
+    packageManager: Optional[str] = None
+
+    def to_vulnerability(self) -> Vulnerability:
+        issue = self.issue
+        return Vulnerability(
+            id=issue.issueData.id,
+            url=issue.issueData.url,
+            title=issue.issueData.title,
+            description=issue.issueData.description or "",
+            upgradePath=self.upgradePath,
+            package=issue.pkgName,
+            version=self.version,
+            severity=issue.issueData.severity,
+            exploitMaturity=issue.issueData.exploitMaturity,
+            isUpgradable=issue.fixInfo.isUpgradable,
+            isPatchable=issue.fixInfo.isPatchable,
+            isPinnable=issue.fixInfo.isPinnable,
+            identifiers=issue.issueData.identifiers,
+            semver=issue.issueData.semver,
+            fromPackages=issue.introducedThrough or [],
+            language=issue.issueData.language,
+            packageManager=self.packageManager,
+            publicationTime=issue.issueData.publicationTime,
+            priorityScore=issue.priorityScore,
+            disclosureTime=issue.issueData.disclosureTime,
+            credit=issue.issueData.credit,
+            CVSSv3=issue.issueData.CVSSv3,
+            cvssScore=issue.issueData.cvssScore,
+            ignored=issue.issueData.ignoreReasons,
+            patched=issue.issueData.patches if issue.isPatched else [],
+        )
+
+
 @dataclass
 class IssueSetAggregated(DataClassJSONMixin):
     issues: List[AggregatedIssue]
@@ -158,6 +224,63 @@ class IssueRelations:
     project_id: str
 
 
+# Manifests are base64 encoded in chunks of this many bytes, a multiple of 3 so
+# that only the final chunk is padded
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+
+def _manifest_bytes(contents: Any) -> memoryview:
+    """
+    Returns a view of the bytes of a manifest given as a string, bytes-like object
+    (including a memory-mapped file) or file object, without copying bytes-like
+    objects.
+    """
+    if not isinstance(contents, (bytes, bytearray, memoryview, mmap.mmap)):
+        # Check for a file-like object, allows us to support files
+        # and strings in the same interface
+        read = getattr(contents, "read", None)
+        if callable(read):
+            contents = contents.read()
+        if isinstance(contents, str):
+            contents = contents.encode()
+    return memoryview(contents).cast("B")
+
+
+def _manifest_post_body(
+    contents: memoryview, additional: Optional[memoryview]
+) -> bytearray:
+    """
+    Builds the JSON body for testing a manifest and optional additional file.
+    The files are base64 encoded a chunk at a time straight into the body, so
+    the body is the only full size copy made.
+    """
+    parts: List[Any] = [b'{"encoding": "base64", "files": {"target": {"contents": "']
+    parts.append(contents)
+    if additional is not None:
+        parts.append(b'"}, "additional": {"contents": "')
+        parts.append(additional)
+    parts.append(b'"}}}')
+
+    size = sum(
+        len(part) if isinstance(part, bytes) else 4 * math.ceil(len(part) / 3)
+        for part in parts
+    )
+    body = bytearray(size)
+    offset = 0
+    for part in parts:
+        if isinstance(part, bytes):
+            body[offset : offset + len(part)] = part
+            offset += len(part)
+            continue
+        for start in range(0, len(part), BASE64_CHUNK_SIZE):
+            encoded = binascii.b2a_base64(
+                part[start : start + BASE64_CHUNK_SIZE], newline=False
+            )
+            body[offset : offset + len(encoded)] = encoded
+            offset += len(encoded)
+    return body
+
+
 @dataclass
 class Organization(DataClassJSONMixin):
     name: str
@@ -167,6 +290,15 @@ class Organization(DataClassJSONMixin):
     group: Optional[OrganizationGroup] = None
     client: Optional[Any] = None
 
+    # The package ecosystems accepted by test_packages, apart from maven, and the
+    # path each is tested under
+    PACKAGE_ECOSYSTEMS: ClassVar[Dict[str, str]] = {
+        "npm": "npm",
+        "pip": "pip",
+        "python": "pip",
+        "rubygems": "rubygems",
+    }
+
     @property
     def projects(self) -> Manager:
         return Manager.factory(Project, self.client, self)
@@ -191,6 +323,35 @@ class Organization(DataClassJSONMixin):
     def integrations(self) -> Manager:
         return Manager.factory(Integration, self.client, self)
 
+    def _get_user(self, user_id: str) -> "User":
+        """
+        Gets a user of this organization, from the client's user cache if it has
+        been looked up recently
+        """
+        if self.client is None:
+            raise SnykError
+
+        # Users are cached as dictionaries, so any cache can store them. They're
+        # rebuilt with User rather than from_dict, which would turn missing
+        # attributes into the string "None".
+        key = f"{self.id}/{user_id}"
+        fields = self.client.user_cache.get(key)
+        if fields is None:
+            user_response = self.client.get(
+                f"orgs/{self.id}/users/{user_id}",
+                version="2023-05-29~beta",
+            )
+            user_data = user_response.json().get("data", {})
+            user_attributes = user_data.get("attributes", {})
+            fields = {
+                "id": user_id,
+                "name": user_attributes.get("name"),
+                "username": user_attributes.get("username"),
+                "email": user_attributes.get("email"),
+            }
+            self.client.user_cache.set(key, fields)
+        return User(**fields)
+
     """
     Imports need integrations, but exposing a high-level API that
     can find the integration from the URL of the thing you want
@@ -259,34 +420,50 @@ class Organization(DataClassJSONMixin):
 
     def _test(self, path, contents=None, additional=None):
         if contents:
-            # Check for a file-like object, allows us to support files
-            # and strings in the same interface
-            read = getattr(contents, "read", None)
-
-            if callable(read):
-                contents = contents.read()
-            encoded = base64.b64encode(contents.encode()).decode()
-            post_body = {
-                "encoding": "base64",
-                "files": {"target": {"contents": encoded}},
-            }
+            contents = _manifest_bytes(contents)
 
             # Some test methods carry a second file, often a lock file
-
-            if additional:
-                read = getattr(additional, "read", None)
-
-                if callable(read):
-                    additional = additional.read()
-                encoded = base64.b64encode(additional.encode()).decode()
-                post_body["files"]["additional"] = {"contents": encoded}
-
-            resp = self.client.post(path, post_body)
+            additional = _manifest_bytes(additional) if additional else None
+
+            # The views must be released even if the test fails, otherwise a
+            # traceback holding this frame stops the caller closing a memory-mapped
+            # file, and the error raised on closing it hides the real one
+            try:
+                return self._test_manifest(path, contents, additional)
+            finally:
+                contents.release()
+                if additional is not None:
+                    additional.release()
         else:
             resp = self.client.get(path)
 
         return IssueSet.from_dict(resp.json())
 
+    def _test_manifest(
+        self, path: str, contents: memoryview, additional: Optional[memoryview]
+    ) -> IssueSet:
+        if self.client is None:
+            raise SnykError
+
+        cache = self.client.manifest_cache
+        if cache is not None:
+            key = "%s:%s:%s" % (
+                path,
+                hashlib.sha256(contents).hexdigest(),
+                hashlib.sha256(additional or b"").hexdigest(),
+            )
+            # Results are cached as dictionaries, so any cache can store them
+            cached = cache.get(key)
+            if cached is not None:
+                return IssueSet.from_dict(cached)
+
+        post_body = _manifest_post_body(contents, additional)
+        resp = self.client.post(path, None, data=post_body)
+        issue_set = IssueSet.from_dict(resp.json())
+        if cache is not None:
+            cache.set(key, issue_set.to_dict())
+        return issue_set
+
     def test_maven(
         self, package_group_id: str, package_artifact_id: str, version: str
     ) -> IssueSet:
@@ -314,6 +491,76 @@ class Organization(DataClassJSONMixin):
 
         return self._test(path)
 
+    def _package_test_path(self, ecosystem: str, name: str, version: str) -> str:
+        if ecosystem == "maven":
+            group_id, _, artifact_id = name.partition(":")
+            if not artifact_id:
+                raise SnykError("Maven packages must be named groupId:artifactId")
+            return "test/maven/%s/%s/%s?org=%s" % (
+                group_id,
+                artifact_id,
+                version,
+                self.id,
+            )
+        try:
+            ecosystem_path = self.PACKAGE_ECOSYSTEMS[ecosystem]
+        except KeyError:
+            raise SnykError("Unsupported package ecosystem: %s" % ecosystem)
+        return "test/%s/%s/%s?org=%s" % (ecosystem_path, name, version, self.id)
+
+    def test_packages(
+        self,
+        packages: Iterable[Tuple[str, str, str]],
+        concurrency: int = 10,
+        errors: Optional[Dict[Tuple[str, str, str], Exception]] = None,
+    ) -> Dict[Tuple[str, str, str], IssueSet]:
+        """
+        Tests each (ecosystem, name, version) package, with up to concurrency tests
+        in flight, and returns the results by package. Maven packages are named
+        groupId:artifactId.
+
+        Repeated packages are only tested once, and results are kept in the client's
+        package_test_cache so a package tested recently isn't tested again.
+
+        A package which fails to test, such as one the API doesn't know, does not
+        stop the others: it is logged and left out of the results, and its error is
+        kept in errors, keyed by package, if a dictionary is given.
+        """
+        if self.client is None:
+            raise SnykError
+
+        cache = self.client.package_test_cache
+        results: Dict[Tuple[str, str, str], IssueSet] = {}
+        pending: Dict[str, List[Tuple[str, str, str]]] = {}
+        for package in dict.fromkeys(packages):
+            path = self._package_test_path(*package)
+            # Results are cached as dictionaries, so any cache can store them and
+            # each call gets its own IssueSet
+            cached = cache.get(path)
+            if cached is not None:
+                results[package] = IssueSet.from_dict(cached)
+            else:
+                pending.setdefault(path, []).append(package)
+
+        def test(path: str) -> Union[IssueSet, Exception]:
+            try:
+                return self._test(path)
+            except Exception as e:
+                return e
+
+        tested = parallel_map(test, pending.keys(), concurrency)
+        for path, issue_set in zip(pending.keys(), tested):
+            if isinstance(issue_set, Exception):
+                logger.warning("Failed to test %s: %s", path, issue_set)
+                if errors is not None:
+                    for package in pending[path]:
+                        errors[package] = issue_set
+                continue
+            for package in pending[path]:
+                results[package] = issue_set
+            cache.set(path, issue_set.to_dict())
+        return results
+
     def test_pipfile(self, contents):
         path = "test/pip?org=%s" % self.id
 
@@ -507,12 +754,14 @@ class DependencyGraphPackageInfo(DataClassJSONMixin):
     version: Optional[str] = None
 
 
+@slotted
 @dataclass
 class DependencyGraphPackage(DataClassJSONMixin):
     id: str
     info: DependencyGraphPackageInfo
 
 
+@slotted
 @dataclass
 class Node(DataClassJSONMixin):
     nodeId: str
@@ -547,6 +796,7 @@ class DependencyProject(DataClassJSONMixin):
     id: str
 
 
+@slotted
 @dataclass
 class Dependency(DataClassJSONMixin):
     id: str
@@ -571,10 +821,20 @@ class User(DataClassJSONMixin):
     email: str
 
 
+def _organization_from_dict(value: Any) -> Organization:
+    # Projects from a listing are given the Organization they belong to, which is
+    # shared rather than copied, and a dictionary otherwise
+    if isinstance(value, Organization):
+        return value
+    return Organization.from_dict(value)
+
+
 @dataclass
 class Project(DataClassJSONMixin):
     name: str
-    organization: Organization
+    organization: Organization = field(
+        metadata={"deserialize": _organization_from_dict}
+    )
     id: str
     created: str
     origin: str
@@ -629,13 +889,21 @@ class Project(DataClassJSONMixin):
 
     def _get_project_snapshot(self):
         """
-        Gets the latest project snapshot
+        Gets the latest project snapshot. It is kept on the instance, outside of the
+        dataclass fields, so reading several of its attributes makes one request.
         """
+        try:
+            return self.__dict__["_snapshot"]
+        except KeyError:
+            pass
+
         project_snapshot_result = self.organization.client.post(
             f"org/{self.organization.id}/project/{self.id}/history?perPage=1&page=1",
             {},
         )
-        return project_snapshot_result.json().get("snapshots", [{}])[0]
+        snapshot = (project_snapshot_result.json().get("snapshots") or [{}])[0]
+        self.__dict__["_snapshot"] = snapshot
+        return snapshot
 
     def __getattr__(self, item):
         """
@@ -667,19 +935,7 @@ class Project(DataClassJSONMixin):
                 selected_user = self.importingUserId
             else:
                 selected_user = self.owningUserId
-            user_response = self.organization.client.get(
-                f"orgs/{self.organization.id}/users/{selected_user}",
-                version="2023-05-29~beta",
-            )
-            user = user_response.json()
-            user_data = user.get("data", {})
-            user_attributes = user_data.get("attributes", {})
-            return User(
-                id=self.importingUserId,
-                name=user_attributes.get("name"),
-                username=user_attributes.get("username"),
-                email=user_attributes.get("email"),
-            )
+            return self.organization._get_user(selected_user)
         elif item == "browseUrl":
             # Ensure that our browse URL matches the tenant the user is making a request to
             tenant_matches = match = re.match(
@@ -733,6 +989,29 @@ class Project(DataClassJSONMixin):
 
     @property
     def vulnerabilities(self) -> List[Vulnerability]:
+        return list(self.iter_vulnerabilities())
+
+    def iter_vulnerabilities(self, concurrency: int = 10) -> Iterator[Vulnerability]:
+        """
+        Yields the vulnerabilities in this project. The paths of each issue are
+        requested with up to concurrency requests in flight, and the vulnerabilities
+        are yielded in the order of the issues as their paths arrive.
+        """
+        for version in self.iter_vulnerable_versions(concurrency):
+            yield version.to_vulnerability()
+
+    @property
+    def vulnerable_versions(self) -> List[VulnerableVersion]:
+        return list(self.iter_vulnerable_versions())
+
+    def iter_vulnerable_versions(
+        self, concurrency: int = 10
+    ) -> Iterator[VulnerableVersion]:
+        """
+        Yields the same entries as iter_vulnerabilities, one for each vulnerable
+        version of a package, but the versions affected by an issue share it rather
+        than each copying its details.
+        """
         vuln_filter = {
             "severities": ["critical", "high", "medium", "low"],
             "types": ["vuln"],
@@ -740,8 +1019,10 @@ class Project(DataClassJSONMixin):
             "patched": False,
         }
         aggregated_vulns = self.issueset_aggregated.filter(**vuln_filter).issues
-        foo = flat_map(self._aggregated_issue_to_vulnerabily, aggregated_vulns)
-        return foo
+        for versions in parallel_map(
+            self._aggregated_issue_to_versions, aggregated_vulns, concurrency
+        ):
+            yield from versions
 
     @property
     def tags(self) -> Manager:
@@ -752,9 +1033,9 @@ class Project(DataClassJSONMixin):
     def notification_settings(self):
         raise SnykNotImplementedError  # pragma: no cover
 
-    def _aggregated_issue_to_vulnerabily(
+    def _aggregated_issue_to_versions(
         self, issue: AggregatedIssue
-    ) -> List[Vulnerability]:
+    ) -> List[VulnerableVersion]:
         issue_paths = Manager.factory(
             IssuePaths,
             self.organization.client,
@@ -774,34 +1055,45 @@ class Project(DataClassJSONMixin):
             upgrade_path = []
 
         return [
-            Vulnerability(
-                id=issue.issueData.id,
-                url=issue.issueData.url,
-                title=issue.issueData.title,
-                description=issue.issueData.description or "",
-                upgradePath=upgrade_path,
-                package=issue.pkgName,
+            VulnerableVersion(
+                issue=issue,
                 version=version,
-                severity=issue.issueData.severity,
-                exploitMaturity=issue.issueData.exploitMaturity,
-                isUpgradable=issue.fixInfo.isUpgradable,
-                isPatchable=issue.fixInfo.isPatchable,
-                isPinnable=issue.fixInfo.isPinnable,
-                identifiers=issue.issueData.identifiers,
-                semver=issue.issueData.semver,
-                fromPackages=issue.introducedThrough or [],
-                language=issue.issueData.language,
+                upgradePath=upgrade_path,
                 packageManager=self.type,
-                publicationTime=issue.issueData.publicationTime,
-                priorityScore=issue.priorityScore,
-                disclosureTime=issue.issueData.disclosureTime,
-                credit=issue.issueData.credit,
-                CVSSv3=issue.issueData.CVSSv3,
-                cvssScore=issue.issueData.cvssScore,
-                ignored=issue.issueData.ignoreReasons,
-                patched=issue.issueData.patches if issue.isPatched else [],
             )
             # Old endpoint returned a new issue if it appeared in multiple
             # versions, emulate that here to preserve upstream api
             for version in issue.pkgVersions
         ]
+
+
+def resolve_users(projects: List[Project], concurrency: int = 10) -> Dict[str, User]:
+    """
+    Looks up the distinct importing and owning users of the projects, with up to
+    concurrency requests in flight, and returns them by user id. The users are
+    kept in the client's user cache, so reading importingUser or owner on these
+    projects afterwards doesn't make any further requests.
+    """
+    pending: Dict[Any, Any] = {}
+    for project in projects:
+        for user_id in [project.importingUserId, project.owningUserId]:
+            if user_id is not None:
+                pending.setdefault((project.organization.id, user_id), project)
+
+    users = parallel_map(
+        lambda key: pending[key].organization._get_user(key[1]),
+        pending.keys(),
+        concurrency,
+    )
+    return {user.id: user for user in users}
+
+
+def prefetch_snapshots(projects: List[Project], concurrency: int = 10) -> None:
+    """
+    Fetches the latest snapshot of each project, with up to concurrency requests in
+    flight, so that reading totalDependencies or the image attributes of these
+    projects afterwards doesn't make any further requests.
+    """
+    pending = {id(x): x for x in projects if "_snapshot" not in x.__dict__}
+    for _ in parallel_map(Project._get_project_snapshot, pending.values(), concurrency):
+        pass
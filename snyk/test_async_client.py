@@ -0,0 +1,244 @@
+import asyncio
+import os
+import re
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import pytest  # type: ignore
+
+from snyk import AsyncSnykClient
+from snyk.async_client import AsyncManager
+from snyk.errors import SnykError, SnykNotFoundError
+from snyk.models import (
+    IssuePaths,
+    IssueRelations,
+    IssueSetAggregated,
+    Organization,
+    Project,
+)
+from snyk.utils import load_test_data
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+class TestAsyncSnykClient(object):
+    @pytest.fixture
+    def client(self):
+        client = AsyncSnykClient("token", concurrency=4)
+        yield client
+        client.close()
+
+    @pytest.fixture
+    def organizations(self):
+        return load_test_data(TEST_DATA, "organizations")
+
+    @pytest.fixture
+    def projects(self):
+        return load_test_data(TEST_DATA, "projects")
+
+    def test_pool_matches_concurrency(self, client):
+        adapter = client.client.session.get_adapter("https://api.snyk.io/v1")
+        assert adapter._pool_maxsize == 4
+
+    def test_get_sends_request_to_snyk(self, requests_mock, client):
+        requests_mock.get("https://api.snyk.io/v1/sample", json={"ping": "pong"})
+        resp = asyncio.run(client.get("sample"))
+        assert resp.json() == {"ping": "pong"}
+
+    def test_post_sends_request_to_snyk(self, requests_mock, client):
+        requests_mock.post("https://api.snyk.io/v1/sample")
+        assert asyncio.run(client.post("sample", {}))
+        assert requests_mock.call_count == 1
+
+    def test_put_sends_request_to_snyk(self, requests_mock, client):
+        requests_mock.put("https://api.snyk.io/v1/sample")
+        assert asyncio.run(client.put("sample", {}))
+
+    def test_delete_sends_request_to_snyk(self, requests_mock, client):
+        requests_mock.delete("https://api.snyk.io/v1/sample")
+        assert asyncio.run(client.delete("sample"))
+
+    def test_get_raises_error(self, requests_mock, client):
+        requests_mock.get("https://api.snyk.io/v1/sample", status_code=500, json={})
+        with pytest.raises(SnykError):
+            asyncio.run(client.get("sample"))
+
+    def test_requests_run_concurrently(self, client, monkeypatch):
+        # The barrier is only passed once every worker is inside a request at the
+        # same time, and times out if requests are made one after another
+        barrier = threading.Barrier(4, timeout=5)
+
+        def get(path, *args, **kwargs):
+            barrier.wait()
+            return path
+
+        monkeypatch.setattr(client.client, "get", get)
+
+        async def fetch_many():
+            return await asyncio.gather(*[client.get("sample") for _ in range(8)])
+
+        assert asyncio.run(fetch_many()) == ["sample"] * 8
+
+    def test_context_manager(self, requests_mock):
+        requests_mock.get("https://api.snyk.io/v1/sample", json={})
+
+        async def fetch():
+            async with AsyncSnykClient("token") as client:
+                resp = await client.get("sample")
+            return client, resp
+
+        client, resp = asyncio.run(fetch())
+        assert resp
+        with pytest.raises(RuntimeError):
+            client._executor.submit(print)
+
+    def test_factory(self, client):
+        with pytest.raises(SnykError):
+            AsyncManager.factory("NoManager", client)
+
+    def test_organizations(self, requests_mock, client, organizations):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        orgs = asyncio.run(client.organizations.all())
+        assert len(orgs) == 2
+        assert all(type(x) is Organization for x in orgs)
+        assert all(x.client is client.client for x in orgs)
+
+    def test_organization_get(self, requests_mock, client, organizations):
+        key = organizations["orgs"][0]["id"]
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        assert "defaultOrg" == asyncio.run(client.organizations.get(key)).name
+        with pytest.raises(SnykNotFoundError):
+            asyncio.run(client.organizations.get("not-present"))
+
+    def test_organization_first_on_empty(self, requests_mock, client):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json={})
+        with pytest.raises(SnykNotFoundError):
+            asyncio.run(client.organizations.first())
+
+    def test_projects(self, requests_mock, client, organizations, projects):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        all_projects = asyncio.run(client.projects.all())
+        assert len(all_projects) == 2
+        assert all(type(x) is Project for x in all_projects)
+
+    def test_projects_collects_organization_errors(
+        self, requests_mock, client, organizations, projects
+    ):
+        failing_org = organizations["orgs"][1]["id"]
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        requests_mock.get(
+            re.compile("orgs/%s/projects.*$" % failing_org),
+            status_code=404,
+            json={"msg": "not found"},
+        )
+        manager = client.projects
+        assert len(asyncio.run(manager.all())) == 1
+        assert list(manager.errors) == [failing_org]
+        assert isinstance(manager.errors[failing_org], SnykError)
+
+    def test_projects_first(self, requests_mock, client, organizations, projects):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        project = asyncio.run(client.projects.first())
+        assert project.name == "testing-new-name"
+        assert requests_mock.call_count == 2
+
+    def test_projects_filter(self, requests_mock, client, organizations, projects):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        assert 2 == len(asyncio.run(client.projects.filter(name="testing-new-name")))
+        assert [] == asyncio.run(client.projects.filter(name="not present"))
+
+    def test_organization_projects_follow_pages(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        next_page = dict(projects, links={"next": "/orgs/%s/projects?page=2" % org.id})
+        requests_mock.get(
+            re.compile("orgs/%s/projects\\?(?!page=2)" % org.id), json=next_page
+        )
+        requests_mock.get(re.compile("projects\\?page=2"), json=projects)
+        org_projects = asyncio.run(AsyncManager.factory(Project, client, org).all())
+        assert len(org_projects) == 2
+        assert all(x.organization is org for x in org_projects)
+
+    def test_organization_projects_next_page_not_filtered_twice(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        next_link = "/orgs/%s/projects?types=maven&starting_after=abc" % org.id
+        requests_mock.get(
+            re.compile("projects\\?(?!.*starting_after)"),
+            json=dict(projects, links={"next": next_link}),
+        )
+        requests_mock.get(re.compile("starting_after=abc"), json=projects)
+        manager = AsyncManager.factory(Project, client, org)
+        assert len(asyncio.run(manager.filter(type="maven"))) == 2
+        assert parse_qs(urlparse(requests_mock.last_request.url).query) == {
+            "types": ["maven"],
+            "starting_after": ["abc"],
+        }
+
+    def test_organization_project_get(self, requests_mock, client, organizations):
+        org = Organization.from_dict(organizations["orgs"][0])
+        requests_mock.get(
+            re.compile("project/6d5813be-7e6d-4ab8-80c2-1e3e2a454545$"),
+            json={
+                "name": "atokeneduser/goof",
+                "id": "6d5813be-7e6d-4ab8-80c2-1e3e2a454545",
+                "created": "2018-10-29T09:50:54.014Z",
+                "origin": "cli",
+                "type": "npm",
+                "readOnly": "false",
+                "testFrequency": "daily",
+                "lastTestedDate": "2023-01-13T09:50:54.014Z",
+                "isMonitored": "true",
+                "issueCountsBySeverity": {"low": 8, "high": 13, "medium": 15},
+            },
+        )
+        project = asyncio.run(
+            AsyncManager.factory(Project, client, org).get(
+                "6d5813be-7e6d-4ab8-80c2-1e3e2a454545"
+            )
+        )
+        assert project.name == "atokeneduser/goof"
+        assert project.organization is org
+
+    def test_issueset_aggregated(self, requests_mock, client, organizations):
+        org = Organization.from_dict(organizations["orgs"][0])
+        project = Project(
+            name="atokeneduser/goof",
+            id="6d5813be-7e6d-4ab8-80c2-1e3e2a454545",
+            created="2018-10-29T09:50:54.014Z",
+            origin="cli",
+            type="npm",
+            readOnly=False,
+            isMonitored=True,
+            testFrequency="daily",
+            lastTestedDate="2023-01-13T09:50:54.014Z",
+            issueCountsBySeverity={"critical": 1, "low": 8, "high": 13, "medium": 15},
+            organization=org,
+        )
+        adapter = requests_mock.post(
+            re.compile("aggregated-issues$"), json={"issues": []}
+        )
+        manager = AsyncManager.factory(IssueSetAggregated, client, project)
+        assert [] == asyncio.run(manager.filter(ignored=True)).issues
+        assert adapter.last_request.json()["filters"]["ignored"] is True
+
+    def test_issue_paths(self, requests_mock, client):
+        requests_mock.get(
+            "https://api.snyk.io/v1/org/org-id/project/project-id/issue/issue-id/paths",
+            json={
+                "snapshotId": "snapshot-id",
+                "paths": [[{"name": "tap", "version": "11.1.5"}]],
+                "total": 1,
+            },
+        )
+        relations = IssueRelations(
+            id="issue-id", organization_id="org-id", project_id="project-id"
+        )
+        paths = asyncio.run(AsyncManager.factory(IssuePaths, client, relations).all())
+        assert paths.paths[0][0].name == "tap"
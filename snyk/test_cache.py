@@ -0,0 +1,133 @@
+import os
+import pickle
+import stat
+
+import pytest  # type: ignore
+
+from snyk.cache import DiskCache, MemoryCache
+from snyk.errors import SnykError
+
+
+class TestMemoryCache(object):
+    @pytest.fixture
+    def cache(self):
+        return MemoryCache(maxsize=2)
+
+    def test_get_missing(self, cache):
+        assert cache.get("missing") is None
+        assert cache.get("missing", "default") == "default"
+
+    def test_set_and_get(self, cache):
+        cache.set("key", {"value": 1})
+        assert cache.get("key") == {"value": 1}
+
+    def test_delete(self, cache):
+        cache.set("key", "value")
+        cache.delete("key")
+        cache.delete("not-present")
+        assert cache.get("key") is None
+
+    def test_clear(self, cache):
+        cache.set("key", "value")
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self, cache):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("snyk.cache.time.time", lambda: now[0])
+        cache = MemoryCache(ttl=60)
+        cache.set("key", "value")
+        now[0] += 59
+        assert cache.get("key") == "value"
+        now[0] += 1
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+
+class TestDiskCache(object):
+    @pytest.fixture
+    def cache(self, tmp_path):
+        return DiskCache(str(tmp_path / "cache"), maxsize=2)
+
+    def test_get_missing(self, cache):
+        assert cache.get("missing") is None
+
+    def test_set_and_get(self, cache):
+        cache.set("key", {"content": b"bytes"})
+        assert cache.get("key") == {"content": b"bytes"}
+
+    def test_shared_between_instances(self, cache):
+        cache.set("key", "value")
+        assert DiskCache(cache.directory).get("key") == "value"
+
+    def test_delete_and_clear(self, cache):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.delete("a")
+        assert cache.get("a") is None
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self, cache):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Make "b" the least recently used entry
+        os.utime(cache._path("b"), (0, 0))
+        cache.get("a")
+        cache.set("c", 3)
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+    def test_entries_expire(self, tmp_path, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("snyk.cache.time.time", lambda: now[0])
+        cache = DiskCache(str(tmp_path), ttl=60)
+        cache.set("key", "value")
+        now[0] += 60
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+    def test_entries_readable_only_by_user(self, cache):
+        cache.set("key", "value")
+        assert stat.S_IMODE(os.stat(cache.directory).st_mode) == 0o700
+        assert stat.S_IMODE(os.stat(cache._path("key")).st_mode) == 0o600
+
+    def test_entries_are_not_unpickled(self, cache, tmp_path):
+        class Planted(object):
+            def __reduce__(self):
+                return (open, (str(tmp_path / "planted"), "w"))
+
+        with open(cache._path("key"), "wb") as the_file:
+            pickle.dump((None, Planted()), the_file)
+        assert cache.get("key", "default") == "default"
+        assert not (tmp_path / "planted").exists()
+
+    def test_unsupported_values(self, cache):
+        with pytest.raises(TypeError):
+            cache.set("key", object())
+
+    def test_refuses_directory_writable_by_others(self, tmp_path):
+        directory = tmp_path / "shared"
+        directory.mkdir()
+        directory.chmod(0o777)
+        with pytest.raises(SnykError):
+            DiskCache(str(directory))
+
+    def test_refuses_directory_of_another_user(self, tmp_path, monkeypatch):
+        if not hasattr(os, "getuid"):
+            pytest.skip("File ownership is only checked on POSIX")
+        uid = os.getuid()
+        monkeypatch.setattr("snyk.cache.os.getuid", lambda: uid + 1)
+        with pytest.raises(SnykError):
+            DiskCache(str(tmp_path))
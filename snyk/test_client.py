@@ -1,13 +1,22 @@
+import gc
+import json
 import os
 import re
+import threading
+import time
+import weakref
+from urllib.parse import parse_qs, urlparse
 
 import pytest  # type: ignore
+import requests
 
 from snyk import SnykClient
 from snyk.__version__ import __version__
-from snyk.errors import SnykError, SnykNotFoundError
+from snyk.cache import DiskCache, MemoryCache
+from snyk.errors import SnykError, SnykNotFoundError, SnykRateLimitError
+from snyk.managers import ProjectManager
 from snyk.models import Organization, Project
-from snyk.utils import load_test_data
+from snyk.utils import SingleFlight, load_test_data
 
 TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
 
@@ -50,6 +59,45 @@ class TestSnykClient(object):
     def test_post_headers_use_correct_mimetype(self, client):
         assert client.api_post_headers["Content-Type"] == "application/json"
 
+    def test_client_owns_a_session(self, client):
+        assert isinstance(client.session, requests.Session)
+
+    def test_session_pool_is_configurable(self):
+        client = SnykClient("token", pool_connections=2, pool_maxsize=20)
+        adapter = client.session.get_adapter("https://api.snyk.io/v1")
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 20
+
+    def test_custom_session(self):
+        session = requests.Session()
+        client = SnykClient("token", session=session)
+        assert client.session is session
+
+    def test_all_verbs_use_session(self, requests_mock):
+        class CountingSession(requests.Session):
+            calls = 0
+
+            def request(self, *args, **kwargs):
+                self.calls += 1
+                return super().request(*args, **kwargs)
+
+        session = CountingSession()
+        client = SnykClient("token", session=session)
+        for verb in ["get", "post", "put", "delete"]:
+            getattr(requests_mock, verb)("https://api.snyk.io/v1/sample", json={})
+        client.get("sample")
+        client.post("sample", {})
+        client.put("sample", {})
+        client.delete("sample")
+        assert session.calls == 4
+
+    def test_context_manager_closes_session(self):
+        with SnykClient("token") as client:
+            adapter = client.session.get_adapter("https://api.snyk.io/v1")
+            adapter.poolmanager.connection_from_url("https://api.snyk.io")
+            assert len(adapter.poolmanager.pools) == 1
+        assert len(adapter.poolmanager.pools) == 0
+
     def test_get_sends_request_to_snyk(self, requests_mock, client):
         requests_mock.get("https://api.snyk.io/v1/sample", text="pong")
         assert client.get("sample")
@@ -119,6 +167,207 @@ class TestSnykClient(object):
             client.get("sample")
         assert requests_mock.call_count == 1
 
+    def test_get_retries_rate_limited_requests(self, requests_mock, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr("snyk.client.time.sleep", sleeps.append)
+        requests_mock.get(
+            "https://api.snyk.io/v1/sample",
+            [
+                {"status_code": 429, "headers": {"Retry-After": "7"}, "json": {}},
+                {"status_code": 200, "json": {}},
+            ],
+        )
+        client = SnykClient("token", tries=2, delay=1, jitter=0)
+        assert client.get("sample")
+        assert requests_mock.call_count == 2
+        assert sleeps == [7.0]
+        assert client.throttled_requests == 1
+        assert client.throttled_seconds == 7.0
+
+    def test_rate_limit_without_retry_after_backs_off(self, requests_mock, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr("snyk.client.time.sleep", sleeps.append)
+        requests_mock.post("https://api.snyk.io/v1/sample", status_code=429, json={})
+        client = SnykClient("token", tries=3, delay=1, backoff=2, jitter=0)
+        with pytest.raises(SnykRateLimitError):
+            client.post("sample", {})
+        assert requests_mock.call_count == 3
+        assert sleeps == [1, 2]
+        assert client.throttled_seconds == 3
+
+    def test_retry_jitter_is_bounded(self, requests_mock, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr("snyk.client.time.sleep", sleeps.append)
+        requests_mock.get(
+            "https://api.snyk.io/v1/sample",
+            status_code=429,
+            headers={"Retry-After": "10"},
+            json={},
+        )
+        client = SnykClient("token", tries=4, jitter=0.5)
+        with pytest.raises(SnykError):
+            client.get("sample")
+        assert len(sleeps) == 3
+        assert all(10 <= x <= 15 for x in sleeps)
+
+    def test_client_errors_are_not_retried(self, requests_mock):
+        requests_mock.get("https://api.snyk.io/v1/sample", status_code=404, json={})
+        client = SnykClient("token", tries=4, delay=0)
+        with pytest.raises(SnykError):
+            client.get("sample")
+        assert requests_mock.call_count == 1
+
+    def test_response_body_decoded_once(self, requests_mock):
+        calls = []
+
+        def loads(data):
+            calls.append(data)
+            return json.loads(data)
+
+        requests_mock.get("https://api.snyk.io/v1/sample", json={"ping": "pong"})
+        client = SnykClient("token", json_decoder=loads)
+        resp = client.get("sample")
+        assert resp.json() == {"ping": "pong"}
+        assert resp.json() is resp.json()
+        assert len(calls) == 1
+
+    def test_decoded_response_is_freed_without_garbage_collection(
+        self, requests_mock, client
+    ):
+        requests_mock.get("https://api.snyk.io/v1/sample", json={"ping": "pong"})
+        gc.disable()
+        try:
+            resp = client.get("sample")
+            assert resp.json() == {"ping": "pong"}
+            ref = weakref.ref(resp)
+            del resp
+            assert ref() is None
+        finally:
+            gc.enable()
+
+    def test_named_json_decoder(self, requests_mock):
+        pytest.importorskip("orjson")
+        requests_mock.get("https://api.snyk.io/v1/sample", json={"ping": "pong"})
+        client = SnykClient("token", json_decoder="orjson")
+        assert client.get("sample").json() == {"ping": "pong"}
+
+    def test_invalid_json_raises_decode_error(self, requests_mock, client):
+        requests_mock.get("https://api.snyk.io/v1/sample", text="pong")
+        with pytest.raises(json.JSONDecodeError):
+            client.get("sample").json()
+
+    def test_get_without_cache_sends_no_validators(self, requests_mock, client):
+        requests_mock.get(
+            "https://api.snyk.io/v1/sample", json={}, headers={"ETag": '"v1"'}
+        )
+        client.get("sample")
+        client.get("sample")
+        assert "If-None-Match" not in requests_mock.last_request.headers
+
+    def test_get_revalidates_cached_responses(self, requests_mock):
+        client = SnykClient("token", cache=MemoryCache())
+        requests_mock.get(
+            "https://api.snyk.io/v1/sample",
+            [
+                {
+                    "json": {"ping": "pong"},
+                    "headers": {
+                        "ETag": '"v1"',
+                        "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+                    },
+                },
+                {"status_code": 304, "headers": {"ETag": '"v1"'}},
+            ],
+        )
+        assert client.get("sample").json() == {"ping": "pong"}
+        resp = client.get("sample")
+        assert requests_mock.last_request.headers["If-None-Match"] == '"v1"'
+        assert (
+            requests_mock.last_request.headers["If-Modified-Since"]
+            == "Wed, 21 Oct 2015 07:28:00 GMT"
+        )
+        assert resp.status_code == 200
+        assert resp.json() == {"ping": "pong"}
+
+    def test_get_cache_updated_when_modified(self, requests_mock):
+        client = SnykClient("token", cache=MemoryCache())
+        requests_mock.get(
+            "https://api.snyk.io/v1/sample",
+            [
+                {"json": {"version": 1}, "headers": {"ETag": '"v1"'}},
+                {"json": {"version": 2}, "headers": {"ETag": '"v2"'}},
+                {"status_code": 304},
+            ],
+        )
+        client.get("sample")
+        assert client.get("sample").json() == {"version": 2}
+        assert client.get("sample").json() == {"version": 2}
+        assert requests_mock.last_request.headers["If-None-Match"] == '"v2"'
+
+    def test_get_cache_keyed_by_params(self, requests_mock, rest_client):
+        rest_client.cache = MemoryCache()
+        requests_mock.get(
+            f"{REST_URL}/orgs/{REST_ORG}/targets", json={}, headers={"ETag": '"v1"'}
+        )
+        rest_client.get(f"orgs/{REST_ORG}/targets", {"limit": 10})
+        rest_client.get(f"orgs/{REST_ORG}/targets", {"limit": 20})
+        assert "If-None-Match" not in requests_mock.last_request.headers
+        assert len(rest_client.cache) == 2
+
+    def test_get_does_not_cache_without_validators(self, requests_mock):
+        client = SnykClient("token", cache=MemoryCache())
+        requests_mock.get("https://api.snyk.io/v1/sample", json={})
+        client.get("sample")
+        assert len(client.cache) == 0
+
+    def test_get_with_disk_cache(self, requests_mock, tmp_path):
+        requests_mock.get(
+            "https://api.snyk.io/v1/sample",
+            [
+                {"json": {"ping": "pong"}, "headers": {"ETag": '"v1"'}},
+                {"status_code": 304},
+            ],
+        )
+        SnykClient("token", cache=DiskCache(str(tmp_path))).get("sample")
+        client = SnykClient("token", cache=DiskCache(str(tmp_path)))
+        assert client.get("sample").json() == {"ping": "pong"}
+
+    def test_single_flight_shares_concurrent_gets(self, requests_mock):
+        started, release = threading.Event(), threading.Event()
+
+        def respond(request, context):
+            started.set()
+            release.wait(2)
+            return {"ping": "pong"}
+
+        requests_mock.get("https://api.snyk.io/v1/sample", json=respond)
+        client = SnykClient("token", single_flight=True)
+        responses = []
+
+        def fetch():
+            responses.append(client.get("sample"))
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        threads[0].start()
+        started.wait(2)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+
+        assert requests_mock.call_count == 1
+        assert len(responses) == 4
+        assert all(resp.json() is responses[0].json() for resp in responses)
+
+    def test_single_flight_keyed_by_version(self, requests_mock, rest_client):
+        rest_client._single_flight = SingleFlight()
+        requests_mock.get(f"{REST_URL}/orgs/{REST_ORG}", json={})
+        rest_client.get(f"orgs/{REST_ORG}", version="2023-01-01")
+        rest_client.get(f"orgs/{REST_ORG}", version="2023-06-01")
+        assert requests_mock.call_count == 2
+
     def test_empty_organizations(self, requests_mock, client):
         requests_mock.get("https://api.snyk.io/v1/orgs", json={})
         assert [] == client.organizations.all()
@@ -159,6 +408,37 @@ class TestSnykClient(object):
         org = client.organizations.get(key)
         assert "defaultOrg" == org.name
 
+    def test_loads_organization_once(self, requests_mock, client, organizations):
+        key = organizations["orgs"][0]["id"]
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        assert client.organizations.get(key) is client.organizations.get(key)
+        assert client.organizations.get(organizations["orgs"][1]["id"])
+        assert requests_mock.call_count == 1
+
+    def test_organization_index_refreshed_for_unknown_id(
+        self, requests_mock, client, organizations
+    ):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        client.organizations.get(organizations["orgs"][0]["id"])
+        with pytest.raises(SnykNotFoundError):
+            client.organizations.get("not-present")
+        assert requests_mock.call_count == 2
+
+    def test_organization_index_expires(
+        self, requests_mock, client, organizations, monkeypatch
+    ):
+        now = [1000.0]
+        monkeypatch.setattr("snyk.cache.time.time", lambda: now[0])
+        key = organizations["orgs"][0]["id"]
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        client.organizations.get(key)
+        now[0] += client.listing_cache.ttl
+        client.organizations.get(key)
+        assert requests_mock.call_count == 2
+        client.listing_cache.clear()
+        client.organizations.get(key)
+        assert requests_mock.call_count == 3
+
     def test_non_existent_organization(self, requests_mock, client, organizations):
         requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
         with pytest.raises(SnykNotFoundError):
@@ -189,6 +469,206 @@ class TestSnykClient(object):
         assert len(client.projects.all()) == 2
         assert all(type(x) is Project for x in client.projects.all())
 
+    def test_projects_follow_next_links_with_prefetch(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        next_page = dict(projects, links={"next": f"/orgs/{org.id}/projects?page=2"})
+        requests_mock.get(re.compile("projects\\?(?!page=2)"), json=next_page)
+        requests_mock.get(re.compile("projects\\?page=2"), json=projects)
+        assert len(org.projects.all(prefetch=1)) == 2
+        assert requests_mock.call_count == 2
+
+    def test_projects_share_their_organization(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        assert all(x.organization is org for x in org.projects.all())
+
+    def test_projects_iter(self, requests_mock, client, organizations, projects):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        projects_iter = client.projects.iter()
+        assert not requests_mock.called
+        assert type(next(projects_iter)) is Project
+        assert len(list(projects_iter)) == 1
+        assert requests_mock.call_count == 3
+
+    def test_projects_across_organizations_concurrently(
+        self, requests_mock, client, organizations, projects
+    ):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        threads = set()
+
+        def callback(request, context):
+            threads.add(threading.get_ident())
+            time.sleep(0.1)
+            return projects
+
+        requests_mock.get(re.compile("projects.*$"), json=callback)
+        assert len(client.projects.all(concurrency=2)) == 2
+        assert len(threads) == 2
+
+    def test_projects_all_keeps_organization_order(
+        self, requests_mock, client, organizations, projects, monkeypatch
+    ):
+        first_org, second_org = [x["id"] for x in organizations["orgs"]]
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        pages = ProjectManager._pages
+
+        def slow_pages(manager, *args, **kwargs):
+            # The first organization finishes listing last
+            if manager.instance.id == first_org:
+                time.sleep(0.1)
+            return pages(manager, *args, **kwargs)
+
+        monkeypatch.setattr(ProjectManager, "_pages", slow_pages)
+        assert [x.organization.id for x in client.projects.iter()] == [
+            second_org,
+            first_org,
+        ]
+        assert [x.organization.id for x in client.projects.all()] == [
+            first_org,
+            second_org,
+        ]
+        assert [
+            x.organization.id for x in client.projects.filter(name="testing-new-name")
+        ] == [first_org, second_org]
+
+    def test_projects_collects_organization_errors(
+        self, requests_mock, client, organizations, projects
+    ):
+        failing_org = organizations["orgs"][1]["id"]
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        requests_mock.get(
+            re.compile(f"orgs/{failing_org}/projects.*$"),
+            status_code=404,
+            json={"msg": "not found"},
+        )
+        manager = client.projects
+        assert len(manager.all()) == 1
+        assert list(manager.errors) == [failing_org]
+        assert isinstance(manager.errors[failing_org], SnykError)
+
+    def test_organization_projects_iter_stops_early(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        next_page = dict(projects, links={"next": f"/orgs/{org.id}/projects?page=2"})
+        requests_mock.get(re.compile("projects\\?(?!page=2)"), json=next_page)
+        requests_mock.get(re.compile("projects\\?page=2"), json=projects)
+        projects_iter = org.projects.iter()
+        assert next(projects_iter).organization is org
+        assert requests_mock.call_count == 1
+
+    def test_organization_projects_first_fetches_one_small_page(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        next_page = dict(projects, links={"next": f"/orgs/{org.id}/projects?page=2"})
+        requests_mock.get(re.compile("projects\\?"), json=next_page)
+        assert org.projects.first().name == "testing-new-name"
+        assert requests_mock.call_count == 1
+        assert requests_mock.last_request.qs["limit"] == ["10"]
+
+    def test_projects_first_skips_empty_organizations(
+        self, requests_mock, client, organizations, projects
+    ):
+        first_org, second_org = [org["id"] for org in organizations["orgs"]]
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile(f"orgs/{first_org}/projects"), json={"data": []})
+        requests_mock.get(re.compile(f"orgs/{second_org}/projects"), json=projects)
+        assert client.projects.first().organization.id == second_org
+        assert requests_mock.call_count == 3
+
+    def test_projects_first_on_empty(self, requests_mock, client, organizations):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json={})
+        with pytest.raises(SnykNotFoundError):
+            client.projects.first()
+
+    def test_filter_projects_pushed_down(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        filtered = org.projects.filter(type="maven", origin="api", isMonitored=True)
+        assert [x.name for x in filtered] == ["testing-new-name"]
+        query = requests_mock.last_request.qs
+        assert query["types"] == ["maven"]
+        assert query["origins"] == ["api"]
+        assert "ismonitored" not in query
+
+    def test_filter_projects_next_page_not_filtered_twice(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        next_link = (
+            f"/orgs/{org.id}/projects?types=maven&origins=api&starting_after=abc"
+        )
+        requests_mock.get(
+            re.compile("projects\\?(?!.*starting_after)"),
+            json=dict(projects, links={"next": next_link}),
+        )
+        requests_mock.get(re.compile("starting_after=abc"), json=projects)
+        assert len(org.projects.filter(type="maven", origin="api")) == 2
+        assert parse_qs(urlparse(requests_mock.last_request.url).query) == {
+            "types": ["maven"],
+            "origins": ["api"],
+            "starting_after": ["abc"],
+        }
+
+    def test_filter_projects_still_filtered_locally(
+        self, requests_mock, client, organizations, projects
+    ):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        assert [] == client.projects.filter(type="npm")
+        assert [] == client.projects.filter(isMonitored=False)
+        assert 2 == len(client.projects.filter(name="testing-new-name"))
+
+    def test_filter_projects_with_comma_not_pushed_down(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        assert [] == org.projects.filter(name="a,b")
+        assert "names" not in requests_mock.last_request.qs
+
+    def test_organization_projects_as_dicts(
+        self, requests_mock, client, organizations, projects
+    ):
+        org = Organization.from_dict(organizations["orgs"][0])
+        org.client = client
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+
+        project_data = list(org.projects.as_dicts())
+        assert len(project_data) == 1
+        assert project_data[0]["name"] == "testing-new-name"
+        assert project_data[0]["organization"]["id"] == org.id
+        assert Project.from_dict(project_data[0]).id == project_data[0]["id"]
+
+        assert list(org.projects.as_dicts(raw=True)) == projects["data"]
+
+    def test_projects_as_dicts(self, requests_mock, client, organizations, projects):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        assert list(client.organizations.as_dicts()) == organizations["orgs"]
+        project_data = list(client.projects.as_dicts(concurrency=2))
+        assert sorted(x["organization"]["id"] for x in project_data) == sorted(
+            org["id"] for org in organizations["orgs"]
+        )
+
     def test_project(self, requests_mock, client, organizations, projects):
         requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
         matcher = re.compile("projects.*$")
@@ -198,6 +678,14 @@ class TestSnykClient(object):
             == client.projects.get("f9fec29a-d288-40d9-a019-cedf825e6efb").name
         )
 
+    def test_project_not_kept_in_listing_cache(
+        self, requests_mock, client, organizations, projects
+    ):
+        requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
+        requests_mock.get(re.compile("projects.*$"), json=projects)
+        assert client.projects.get("f9fec29a-d288-40d9-a019-cedf825e6efb")
+        assert client.listing_cache.get("Project/") is None
+
     def test_non_existent_project(self, requests_mock, client, organizations, projects):
         requests_mock.get("https://api.snyk.io/v1/orgs", json=organizations)
         matcher = re.compile("projects.*$")
@@ -323,6 +811,71 @@ class TestSnykClient(object):
 
         assert len(data) == 30
 
+    @pytest.fixture
+    def rest_targets_pages(
+        self, requests_mock, rest_targets_page1, rest_targets_page2, rest_targets_page3
+    ):
+        base = f"{REST_URL}/orgs/{REST_ORG}/targets?limit=10&version={REST_VERSION}"
+        requests_mock.get(base, json=rest_targets_page1)
+        requests_mock.get(
+            f"{base}&excludeEmpty=true&starting_after=v1.eyJpZCI6IjMyODE4ODAifQ%3D%3D",
+            json=rest_targets_page2,
+        )
+        requests_mock.get(
+            f"{base}&excludeEmpty=true&starting_after=v1.eyJpZCI6IjI5MTk1NjgifQ%3D%3D",
+            json=rest_targets_page3,
+        )
+        return requests_mock
+
+    def test_iter_rest_pages(self, rest_client, rest_targets_pages):
+        pages = list(
+            rest_client.iter_rest_pages(f"orgs/{REST_ORG}/targets", {"limit": 10})
+        )
+        assert [len(page) for page in pages] == [10, 10, 10]
+        assert rest_targets_pages.call_count == 3
+
+    def test_iter_rest_items(self, rest_client, rest_targets_pages, rest_targets_page1):
+        items = rest_client.iter_rest_items(f"orgs/{REST_ORG}/targets", {"limit": 10})
+        assert next(items) == rest_targets_page1["data"][0]
+        assert len(list(items)) == 29
+
+    def test_get_rest_pages_with_prefetch(self, rest_client, rest_targets_pages):
+        data = rest_client.get_rest_pages(
+            f"orgs/{REST_ORG}/targets", {"limit": 10}, prefetch=2
+        )
+        assert len(data) == 30
+        assert rest_targets_pages.call_count == 3
+
+    def test_iter_rest_pages_stops_early(self, rest_client, rest_targets_pages):
+        pages = rest_client.iter_rest_pages(f"orgs/{REST_ORG}/targets", {"limit": 10})
+        assert len(next(pages)) == 10
+        pages.close()
+        assert rest_targets_pages.call_count == 1
+
+    def test_iter_rest_pages_stops_when_next_is_self(
+        self, requests_mock, rest_client, rest_targets_page1
+    ):
+        url = f"{REST_URL}/orgs/{REST_ORG}/targets?limit=10&version={REST_VERSION}"
+        page = dict(rest_targets_page1, links={"self": "/targets", "next": "/targets"})
+        requests_mock.get(url, json=page)
+        pages = list(
+            rest_client.iter_rest_pages(f"orgs/{REST_ORG}/targets", {"limit": 10})
+        )
+        assert len(pages) == 1
+        assert requests_mock.call_count == 1
+
+    def test_iter_rest_pages_stops_on_empty_page(
+        self, requests_mock, rest_client, rest_targets_page1
+    ):
+        url = f"{REST_URL}/orgs/{REST_ORG}/targets?limit=10&version={REST_VERSION}"
+        requests_mock.get(url, json=rest_targets_page1)
+        requests_mock.get(re.compile("starting_after"), json={"data": [], "links": {}})
+        pages = list(
+            rest_client.iter_rest_pages(f"orgs/{REST_ORG}/targets", {"limit": 10})
+        )
+        assert len(pages) == 1
+        assert requests_mock.call_count == 2
+
     def test_rest_limit_deduplication(self, requests_mock, rest_client):
         requests_mock.get(
             f"{REST_URL}/orgs/{REST_ORG}/projects?limit=100&version={REST_VERSION}"
@@ -1,10 +1,31 @@
+import base64
+import dataclasses
+import mmap
+import pickle
 import re
+import time
 
 import pytest  # type: ignore
 
+import snyk.models
+from snyk.cache import DiskCache, MemoryCache
 from snyk.client import SnykClient
-from snyk.errors import SnykError, SnykNotFoundError, SnykNotImplementedError
-from snyk.models import Integration, Member, Organization, Project, Vulnerability
+from snyk.errors import (
+    SnykError,
+    SnykHTTPError,
+    SnykNotFoundError,
+    SnykNotImplementedError,
+)
+from snyk.models import (
+    Integration,
+    IssueSet,
+    Member,
+    Organization,
+    Project,
+    Vulnerability,
+    prefetch_snapshots,
+    resolve_users,
+)
 
 
 class TestModels(object):
@@ -85,6 +106,23 @@ class TestOrganization(TestModels):
         assert all(type(x) is Member for x in organization.members.all())
         assert "admin" == organization.members.first().role
 
+    def test_members_as_dicts(self, organization, requests_mock, members):
+        requests_mock.get(re.compile("members$"), json=members)
+        assert members == list(organization.members.as_dicts())
+
+    def test_licenses_as_dicts(self, organization, requests_mock):
+        licenses = [{"id": "MIT", "severity": "none", "instructions": ""}]
+        requests_mock.post(re.compile("licenses$"), json={"results": licenses})
+        assert licenses == list(organization.licenses.as_dicts())
+
+    def test_dependencies_as_dicts(self, organization, organization_url, requests_mock):
+        dependency = {"id": "ms@1.0.0", "name": "ms", "version": "1.0.0"}
+        requests_mock.post(
+            "%s/dependencies" % organization_url,
+            json={"total": 1001, "results": [dependency]},
+        )
+        assert [dependency, dependency] == list(organization.dependencies.as_dicts())
+
     def test_empty_entitlements(self, organization, requests_mock):
         matcher = re.compile("entitlements$")
         requests_mock.get(matcher, json={})
@@ -120,6 +158,134 @@ class TestOrganization(TestModels):
         )
         assert [] == organization.dependencies.all()
 
+    def test_dependencies_pages_fetched_in_order(
+        self, organization, organization_url, requests_mock
+    ):
+        def dependency(name):
+            return {
+                "id": "%s@1.0.0" % name,
+                "name": name,
+                "version": "1.0.0",
+                "licenses": [],
+                "projects": [],
+            }
+
+        for page in [1, 2, 3]:
+            requests_mock.post(
+                "%s/dependencies?page=%s" % (organization_url, page),
+                json={"total": 2001, "results": [dependency("page-%s" % page)]},
+            )
+        dependencies = organization.dependencies.all(concurrency=3)
+        assert [x.name for x in dependencies] == ["page-1", "page-2", "page-3"]
+        assert requests_mock.call_count == 3
+
+    def test_dependencies_fetched_serially(
+        self, organization, organization_url, requests_mock
+    ):
+        requests_mock.post(
+            "%s/dependencies" % organization_url, json={"total": 3000, "results": []}
+        )
+        assert [] == organization.dependencies.all(concurrency=1)
+        assert requests_mock.call_count == 3
+
+    def test_first_dependency_requests_one_result(
+        self, organization, organization_url, requests_mock
+    ):
+        requests_mock.post(
+            "%s/dependencies?perPage=1" % organization_url,
+            json={
+                "total": 3000,
+                "results": [
+                    {
+                        "id": "django@4.0.0",
+                        "name": "django",
+                        "version": "4.0.0",
+                        "licenses": [],
+                        "projects": [],
+                    }
+                ],
+            },
+        )
+        assert organization.dependencies.first().name == "django"
+        assert requests_mock.call_count == 1
+
+    def test_first_dependency_on_empty(
+        self, organization, organization_url, requests_mock
+    ):
+        requests_mock.post(
+            "%s/dependencies" % organization_url, json={"total": 0, "results": []}
+        )
+        with pytest.raises(SnykNotFoundError):
+            organization.dependencies.first()
+
+    def test_test_packages(self, organization, base_url, blank_test, requests_mock):
+        requests_mock.get(re.compile("%s/test/" % base_url), json=blank_test)
+        packages = [
+            ("pip", "django", "4.0.0"),
+            ("npm", "ms", "1.0.0"),
+            ("rubygems", "puppet", "4.0.0"),
+            ("maven", "spring:springboot", "1.0.0"),
+            ("pip", "django", "4.0.0"),
+            ("python", "django", "4.0.0"),
+        ]
+        results = organization.test_packages(packages, concurrency=2)
+        assert set(results) == set(packages)
+        assert all(type(x) is IssueSet for x in results.values())
+        assert requests_mock.call_count == 4
+        assert sorted(x.path for x in requests_mock.request_history) == [
+            "/v1/test/maven/spring/springboot/1.0.0",
+            "/v1/test/npm/ms/1.0.0",
+            "/v1/test/pip/django/4.0.0",
+            "/v1/test/rubygems/puppet/4.0.0",
+        ]
+
+        assert organization.test_packages(packages[:2]) == {
+            package: results[package] for package in packages[:2]
+        }
+        assert requests_mock.call_count == 4
+
+    def test_test_packages_cached_on_disk(
+        self, organization, base_url, blank_test, requests_mock, tmp_path
+    ):
+        organization.client.package_test_cache = DiskCache(str(tmp_path / "packages"))
+        requests_mock.get(re.compile("%s/test/" % base_url), json=blank_test)
+        packages = [("npm", "ms", "1.0.0"), ("pip", "django", "4.0.0")]
+        results = organization.test_packages(packages)
+        cached = organization.test_packages(packages)
+        assert cached == results
+        assert cached[packages[0]] is not results[packages[0]]
+        assert requests_mock.call_count == 2
+
+    def test_test_packages_keeps_other_results_on_error(
+        self, organization, base_url, blank_test, requests_mock
+    ):
+        requests_mock.get(re.compile("%s/test/" % base_url), json=blank_test)
+        requests_mock.get(
+            "%s/test/npm/nope/1.0.0" % base_url,
+            status_code=404,
+            json={"message": "not found"},
+        )
+        packages = [
+            ("npm", "ms", "1.0.0"),
+            ("npm", "nope", "1.0.0"),
+            ("npm", "ms", "2.0.0"),
+        ]
+        errors = {}
+        results = organization.test_packages(packages, errors=errors)
+        assert list(results) == [packages[0], packages[2]]
+        assert list(errors) == [packages[1]]
+        assert isinstance(errors[packages[1]], SnykError)
+
+        # Successful results are cached, the failed package is tested again
+        assert organization.test_packages(packages) == results
+        assert requests_mock.call_count == 4
+
+    def test_test_packages_unsupported(self, organization):
+        with pytest.raises(SnykError):
+            organization.test_packages([("cargo", "serde", "1.0.0")])
+        with pytest.raises(SnykError):
+            organization.test_packages([("maven", "springboot", "1.0.0")])
+
     def test_rubygems_test(self, organization, base_url, blank_test, requests_mock):
         requests_mock.get("%s/test/rubygems/puppet/4.0.0" % base_url, json=blank_test)
         assert organization.test_rubygem("puppet", "4.0.0")
@@ -205,6 +371,81 @@ class TestOrganization(TestModels):
         requests_mock.post("%s/test/yarn" % base_url, json=blank_test)
         assert organization.test_yarn(fake_file, fake_file)
 
+    @pytest.mark.parametrize(
+        "contents", ["x", "xy", "xyz", "Pipfile \u2603\n" * 10, b"\x00\xffbinary"]
+    )
+    def test_manifest_post_body(
+        self, organization, base_url, blank_test, requests_mock, monkeypatch, contents
+    ):
+        # Use a small chunk size, so that the files are encoded in several chunks
+        monkeypatch.setattr(snyk.models, "BASE64_CHUNK_SIZE", 6)
+        requests_mock.post("%s/test/npm" % base_url, json=blank_test)
+        organization.test_packagejson(contents, "lock")
+        raw = contents.encode() if isinstance(contents, str) else contents
+        assert requests_mock.last_request.json() == {
+            "encoding": "base64",
+            "files": {
+                "target": {"contents": base64.b64encode(raw).decode()},
+                "additional": {"contents": base64.b64encode(b"lock").decode()},
+            },
+        }
+
+    def test_manifest_test_with_bytes_and_mmap(
+        self, organization, base_url, blank_test, requests_mock, tmp_path
+    ):
+        manifest = tmp_path / "yarn.lock"
+        manifest.write_bytes(b"lockfile contents")
+        requests_mock.post("%s/test/yarn" % base_url, json=blank_test)
+        with open(manifest, "rb") as binary_file:
+            assert organization.test_yarn(b"{}", binary_file)
+            binary_body = requests_mock.last_request.json()
+        with open(manifest, "rb") as binary_file:
+            with mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                assert organization.test_yarn(bytearray(b"{}"), mapped)
+        assert requests_mock.last_request.json() == binary_body
+        assert (
+            binary_body["files"]["additional"]["contents"]
+            == base64.b64encode(b"lockfile contents").decode()
+        )
+
+    def test_manifest_test_error_with_mmap(
+        self, organization, base_url, requests_mock, tmp_path
+    ):
+        manifest = tmp_path / "yarn.lock"
+        manifest.write_bytes(b"lockfile contents")
+        requests_mock.post(
+            "%s/test/yarn" % base_url, status_code=400, json={"message": "invalid"}
+        )
+        with pytest.raises(SnykHTTPError):
+            with open(manifest, "rb") as binary_file:
+                with mmap.mmap(
+                    binary_file.fileno(), 0, access=mmap.ACCESS_READ
+                ) as mapped:
+                    organization.test_yarn(mapped, mapped)
+
+    def test_manifest_test_cached(
+        self, organization, base_url, blank_test, requests_mock
+    ):
+        organization.client.manifest_cache = MemoryCache()
+        requests_mock.post("%s/test/npm" % base_url, json=blank_test)
+        requests_mock.post("%s/test/yarn" % base_url, json=blank_test)
+        first = organization.test_packagejson("{}", "lock")
+        assert organization.test_packagejson("{}", "lock") == first
+        assert requests_mock.call_count == 1
+        organization.test_packagejson("{}")
+        organization.test_packagejson("{}", "other lock")
+        organization.test_yarn("{}", "lock")
+        assert requests_mock.call_count == 4
+
+    def test_manifest_test_cached_on_disk(
+        self, organization, base_url, blank_test, requests_mock, tmp_path
+    ):
+        organization.client.manifest_cache = DiskCache(str(tmp_path / "manifests"))
+        requests_mock.post("%s/test/npm" % base_url, json=blank_test)
+        first = organization.test_packagejson("{}")
+        assert organization.test_packagejson("{}") == first
+        assert requests_mock.call_count == 1
+
     def test_missing_package_test(self, organization, base_url, requests_mock):
         requests_mock.get("%s/test/rubygems/puppet/4.0.0" % base_url, status_code=404)
         with pytest.raises(SnykError):
@@ -293,6 +534,16 @@ class TestOrganization(TestModels):
             is not None
         )
 
+    def test_get_project_keeps_organization(self, organization, project, requests_mock):
+        matcher = re.compile("project/6d5813be-7e6d-4ab8-80c2-1e3e2a454545$")
+        requests_mock.get(matcher, json=project)
+        assert (
+            organization.projects.get(
+                "6d5813be-7e6d-4ab8-80c2-1e3e2a454545"
+            ).organization
+            is organization
+        )
+
     def test_filter_projects_by_tag_missing_value(self, organization, requests_mock):
         with pytest.raises(SnykError):
             organization.projects.filter(tags=[{"key": "some-key"}])
@@ -478,6 +729,91 @@ class TestProject(TestModels):
         with pytest.raises(SnykError):
             out = project.jira_issues.create(issue_id, {})
 
+    def test_snapshot_fetched_once(self, project, project_url, requests_mock):
+        requests_mock.post(
+            "%s/history" % project_url,
+            json={
+                "snapshots": [
+                    {
+                        "totalDependencies": 42,
+                        "imageId": "sha256:abc",
+                        "imageTag": "latest",
+                        "baseImageName": "alpine:3",
+                        "imagePlatform": "linux/amd64",
+                    }
+                ]
+            },
+        )
+        assert project.totalDependencies == 42
+        assert project.imageId == "sha256:abc"
+        assert project.imageTag == "latest"
+        assert project.imageBaseImage == "alpine:3"
+        assert project.imagePlatform == "linux/amd64"
+        assert requests_mock.call_count == 1
+
+    def test_snapshot_without_snapshots(self, project, project_url, requests_mock):
+        requests_mock.post("%s/history" % project_url, json={"snapshots": []})
+        assert project.totalDependencies == 0
+        assert project.imageId is None
+
+    def test_prefetch_snapshots(self, project, requests_mock):
+        other_project = dataclasses.replace(
+            project, id="f9fec29a-d288-40d9-a019-cedf825e6efb"
+        )
+        requests_mock.post(
+            re.compile("history"), json={"snapshots": [{"totalDependencies": 7}]}
+        )
+        prefetch_snapshots([project, other_project, project], concurrency=2)
+        assert requests_mock.call_count == 2
+        assert project.totalDependencies == 7
+        assert other_project.totalDependencies == 7
+        prefetch_snapshots([project, other_project])
+        assert requests_mock.call_count == 2
+
+    @pytest.fixture
+    def users_url(self, organization):
+        return "https://api.snyk.io/rest/orgs/%s/users" % organization.id
+
+    def user(self, name):
+        return {"data": {"attributes": {"name": name, "username": name, "email": ""}}}
+
+    def test_importing_user_and_owner(self, project, users_url, requests_mock):
+        project.importingUserId = "importer"
+        project.owningUserId = "owner"
+        requests_mock.get("%s/importer" % users_url, json=self.user("Importer"))
+        requests_mock.get("%s/owner" % users_url, json=self.user("Owner"))
+        assert project.importingUser.id == "importer"
+        assert project.importingUser.name == "Importer"
+        assert project.owner.id == "owner"
+        assert project.owner.name == "Owner"
+        assert requests_mock.call_count == 2
+
+    def test_users_cached_on_disk(self, project, users_url, requests_mock, tmp_path):
+        project.organization.client.user_cache = DiskCache(str(tmp_path / "users"))
+        project.owningUserId = "owner"
+        requests_mock.get(
+            "%s/owner" % users_url, json={"data": {"attributes": {"name": "Owner"}}}
+        )
+        assert project.owner.name == "Owner"
+        assert project.owner.email is None
+        assert requests_mock.call_count == 1
+
+    def test_resolve_users(self, project, users_url, requests_mock):
+        projects = []
+        for index in range(4):
+            other_project = dataclasses.replace(project, id=str(index))
+            other_project.importingUserId = "service-account"
+            other_project.owningUserId = "owner-%s" % (index % 2)
+            projects.append(other_project)
+        requests_mock.get(
+            re.compile(users_url), json=lambda request, context: self.user("A User")
+        )
+        users = resolve_users(projects, concurrency=2)
+        assert sorted(users) == ["owner-0", "owner-1", "service-account"]
+        assert requests_mock.call_count == 3
+        assert all(x.owner.name == "A User" for x in projects)
+        assert requests_mock.call_count == 3
+
     def test_empty_dependencies(self, project, organization_url, requests_mock):
         requests_mock.post(
             "%s/dependencies" % organization_url, json={"total": 0, "results": []}
@@ -503,6 +839,25 @@ class TestProject(TestModels):
         )
         assert [] == project.issueset_aggregated.all().issues
 
+    def test_issues_aggregated_lazy(self, project, project_url, requests_mock):
+        issue = {"id": "npm:ms:20170412", "pkgName": "ms", "isIgnored": False}
+        requests_mock.post(
+            "%s/aggregated-issues" % project_url, json={"issues": [issue]}
+        )
+        issues = project.issueset_aggregated.filter(lazy=True, types=["vuln"]).issues
+        assert [(x.id, x.pkgName, x.isIgnored) for x in issues] == [
+            ("npm:ms:20170412", "ms", False)
+        ]
+        assert len(project.issueset_aggregated.all(lazy=True).issues) == 1
+
+    def test_issues_aggregated_as_dicts(self, project, project_url, requests_mock):
+        issues = [{"id": "npm:ms:20170412", "pkgName": "ms"}]
+        requests_mock.post(
+            "%s/aggregated-issues" % project_url, json={"issues": issues}
+        )
+        assert issues == list(project.issueset_aggregated.as_dicts(types=["vuln"]))
+        assert requests_mock.last_request.json()["filters"]["types"] == ["vuln"]
+
     def test_empty_vulnerabilities(self, project, project_url, requests_mock):
         requests_mock.post(
             "%s/aggregated-issues" % project_url,
@@ -648,6 +1003,100 @@ class TestProject(TestModels):
         ]
         assert expected == project.vulnerabilities
 
+    def test_iter_vulnerabilities_keeps_issue_order(
+        self, project, project_url, requests_mock
+    ):
+        def issue(issue_id):
+            return {
+                "id": issue_id,
+                "issueType": "vuln",
+                "pkgName": issue_id,
+                "pkgVersions": ["1.0.0", "2.0.0"],
+                "issueData": {
+                    "id": issue_id,
+                    "title": issue_id,
+                    "severity": "low",
+                    "url": "https://example.com/%s" % issue_id,
+                    "exploitMaturity": "no-known-exploit",
+                },
+                "isPatched": False,
+                "isIgnored": False,
+                "fixInfo": {
+                    "isUpgradable": False,
+                    "isPinnable": False,
+                    "isPatchable": False,
+                    "isFixable": False,
+                    "isPartiallyFixable": False,
+                    "nearestFixedInVersion": "",
+                },
+            }
+
+        issue_ids = ["issue-%s" % index for index in range(6)]
+        requests_mock.post(
+            "%s/aggregated-issues" % project_url,
+            json={"issues": [issue(issue_id) for issue_id in issue_ids]},
+        )
+
+        def paths(request, context):
+            # Answer the earlier issues last
+            time.sleep(0.01 * (6 - int(request.path.split("/")[-2][-1])))
+            return {"snapshotId": "snapshot", "paths": [], "total": 0}
+
+        requests_mock.get(re.compile("paths$"), json=paths)
+        vulnerabilities = list(project.iter_vulnerabilities(concurrency=3))
+        assert [(x.id, x.version) for x in vulnerabilities] == [
+            (issue_id, version)
+            for issue_id in issue_ids
+            for version in ["1.0.0", "2.0.0"]
+        ]
+        assert vulnerabilities == project.vulnerabilities
+        # The issue models are slotted, so have no __dict__ but can be pickled
+        assert not hasattr(vulnerabilities[0], "__dict__")
+        assert pickle.loads(pickle.dumps(vulnerabilities)) == vulnerabilities
+
+    def test_vulnerable_versions_share_issue(self, project, project_url, requests_mock):
+        requests_mock.post(
+            "%s/aggregated-issues" % project_url,
+            json={
+                "issues": [
+                    {
+                        "id": "test",
+                        "issueType": "vuln",
+                        "pkgName": "test",
+                        "pkgVersions": ["1.0.0", "1.1.0", "1.2.0"],
+                        "issueData": {
+                            "id": "test",
+                            "title": "test",
+                            "severity": "low",
+                            "url": "https://example.com/test",
+                            "exploitMaturity": "no-known-exploit",
+                            "description": "A long description",
+                        },
+                        "isPatched": False,
+                        "isIgnored": False,
+                        "fixInfo": {
+                            "isUpgradable": False,
+                            "isPinnable": False,
+                            "isPatchable": False,
+                            "isFixable": False,
+                            "isPartiallyFixable": False,
+                            "nearestFixedInVersion": "2.0.0",
+                        },
+                    }
+                ]
+            },
+        )
+        requests_mock.get(
+            "{}/issue/test/paths".format(project_url),
+            json={"snapshotId": "snapshot", "paths": [], "total": 0},
+        )
+        versions = project.vulnerable_versions
+        assert [x.version for x in versions] == ["1.0.0", "1.1.0", "1.2.0"]
+        assert all(x.issue is versions[0].issue for x in versions)
+        assert all(x.packageManager == "npm" for x in versions)
+        assert [x.to_vulnerability() for x in versions] == project.vulnerabilities
+        assert pickle.loads(pickle.dumps(versions)) == versions
+
     def test_aggregated_issues_missing_optional_fields(
         self, project, project_url, requests_mock
     ):
@@ -1,5 +1,23 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import pytest  # type: ignore
+from mashumaro.mixins.json import DataClassJSONMixin  # type: ignore
+
 from snyk.models import Package
-from snyk.utils import flat_map, format_package, snake_to_camel
+from snyk.utils import (
+    SingleFlight,
+    flat_map,
+    format_package,
+    get_json_decoder,
+    parallel_map,
+    parse_retry_after,
+    prefetch_iter,
+    slotted,
+    snake_to_camel,
+)
 
 
 class TestUtils(object):
@@ -20,3 +38,133 @@ class TestUtils(object):
         case = Package(name="foo", version="123")
         expected = "foo@123"
         assert format_package(case) == expected
+
+    def test_parse_retry_after_seconds(self):
+        assert parse_retry_after("120") == 120.0
+
+    def test_parse_retry_after_date_in_the_past(self):
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+    def test_parse_retry_after_missing_or_invalid(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+
+    def test_prefetch_iter_preserves_order(self):
+        assert list(prefetch_iter(range(10), 3)) == list(range(10))
+
+    def test_prefetch_iter_without_depth_runs_inline(self):
+        threads = []
+
+        def produce():
+            threads.append(threading.current_thread())
+            yield 1
+
+        assert list(prefetch_iter(produce(), 0)) == [1]
+        assert threads == [threading.current_thread()]
+
+    def test_prefetch_iter_raises_producer_errors(self):
+        def produce():
+            yield 1
+            raise ValueError("boom")
+
+        items = prefetch_iter(produce(), 2)
+        assert next(items) == 1
+        with pytest.raises(ValueError):
+            next(items)
+
+    def test_prefetch_iter_stays_depth_ahead(self):
+        produced = []
+
+        def produce():
+            for i in range(10):
+                produced.append(i)
+                yield i
+
+        items = prefetch_iter(produce(), 1)
+        assert next(items) == 0
+        deadline = time.time() + 2
+        while len(produced) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert produced == [0, 1]
+        items.close()
+
+    def test_parallel_map_preserves_order(self):
+        def slow_double(value):
+            time.sleep(0.01 * (5 - value))
+            return value * 2
+
+        assert list(parallel_map(slow_double, range(5), 5)) == [0, 2, 4, 6, 8]
+
+    def test_parallel_map_serially(self):
+        assert list(parallel_map(str, [1, 2], 1)) == ["1", "2"]
+
+    def test_default_json_decoder(self):
+        assert get_json_decoder()(b'{"key": [1, 2]}') == {"key": [1, 2]}
+
+    def test_auto_json_decoder(self):
+        assert get_json_decoder("auto")(b'{"key": true}') == {"key": True}
+
+    def test_unknown_json_decoder(self):
+        with pytest.raises(ValueError):
+            get_json_decoder("yaml")
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return object()
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+        leader.start()
+        started.wait(2)
+        waiters = [
+            threading.Thread(target=lambda: results.append(flight.do("k", work)))
+            for _ in range(4)
+        ]
+        for waiter in waiters:
+            waiter.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + waiters:
+            thread.join(2)
+
+        assert len(calls) == 1
+        assert len(results) == 5
+        assert all(result is results[0] for result in results)
+
+    def test_single_flight_does_not_cache_finished_calls(self):
+        flight = SingleFlight()
+        assert flight.do("k", lambda: 1) == 1
+        assert flight.do("k", lambda: 2) == 2
+
+    def test_single_flight_shares_errors(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            flight.do("k", fail)
+
+    def test_slotted_dataclass(self):
+        @slotted
+        @dataclass
+        class Slotted(DataClassJSONMixin):
+            name: str
+            version: Optional[str] = None
+            paths: List[str] = field(default_factory=list)
+
+        first = Slotted.from_dict({"name": "ms"})
+        second = Slotted("ms")
+        assert not hasattr(first, "__dict__")
+        assert first == second
+        assert first.paths is not second.paths
+        assert first.to_dict() == {"name": "ms", "version": None, "paths": []}
+        with pytest.raises(AttributeError):
+            first.unknown = True
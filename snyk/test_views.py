@@ -0,0 +1,62 @@
+import pytest  # type: ignore
+
+from snyk.models import AggregatedIssue, IssueSetAggregated
+from snyk.views import ModelView
+
+
+class TestModelView(object):
+    @pytest.fixture
+    def issue(self):
+        return {
+            "id": "npm:ms:20170412",
+            "issueType": "vuln",
+            "pkgName": "ms",
+            "pkgVersions": ["1.0.0"],
+            "issueData": {
+                "id": "npm:ms:20170412",
+                "title": "Regular Expression Denial of Service (ReDoS)",
+                "severity": "low",
+                "url": "https://security.snyk.io/vuln/npm:ms:20170412",
+                "exploitMaturity": "no-known-exploit",
+            },
+            "isPatched": False,
+            "isIgnored": False,
+            "fixInfo": {
+                "isUpgradable": True,
+                "isPinnable": False,
+                "isPatchable": False,
+                "isFixable": True,
+                "isPartiallyFixable": False,
+                "nearestFixedInVersion": "2.0.0",
+            },
+        }
+
+    def test_fields(self, issue):
+        view = ModelView(AggregatedIssue, issue)
+        assert view.pkgName == "ms"
+        assert view.pkgVersions == ["1.0.0"]
+        assert view.issueData.severity == "low"
+        assert view.fixInfo.isUpgradable
+        assert view.issueData is view.issueData
+
+    def test_defaults(self, issue):
+        view = ModelView(AggregatedIssue, issue)
+        assert view.introducedThrough is None
+        assert view.issueData.description is None
+
+    def test_missing_fields(self, issue):
+        del issue["pkgName"]
+        view = ModelView(AggregatedIssue, issue)
+        with pytest.raises(AttributeError):
+            view.pkgName
+        with pytest.raises(AttributeError):
+            view.notAField
+
+    def test_nested_models_are_only_read_when_accessed(self, issue):
+        issue["fixInfo"] = "not an object"
+        view = ModelView(IssueSetAggregated, {"issues": [issue]})
+        assert [x.pkgName for x in view.issues] == ["ms"]
+
+    def test_to_model(self, issue):
+        view = ModelView(IssueSetAggregated, {"issues": [issue]})
+        assert view.to_model() == IssueSetAggregated.from_dict({"issues": [issue]})
@@ -1,6 +1,17 @@
+import dataclasses
 import json
 import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from itertools import chain
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+C = TypeVar("C", bound=type)
 
 
 def snake_to_camel(word):
@@ -41,6 +52,187 @@ def cleanup_path(path: str) -> str:
     return "/".join(parts)
 
 
+def parallel_map(
+    fn: Callable[[T], R], items: Iterable[T], concurrency: int
+) -> Iterator[R]:
+    """
+    Maps fn over items using up to concurrency worker threads, yielding the results
+    in the same order as items as they become available.
+    """
+    if concurrency <= 1:
+        yield from map(fn, items)
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        yield from executor.map(fn, items)
+
+
+def prefetch_iter(iterable: Iterable[T], depth: int) -> Iterator[T]:
+    """
+    Iterates over iterable on a background thread, staying up to depth items ahead
+    of the consumer. This lets the next page of a paginated response be fetched
+    while the current one is still being processed.
+
+    Exceptions raised while producing items are re-raised in the consumer, and
+    closing the returned iterator early stops the background thread from fetching
+    anything more. A depth of 0 iterates in the calling thread as normal.
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+
+    done = object()
+    results: "queue.Queue[Any]" = queue.Queue()
+    # A slot is taken before producing each item and handed back as the consumer
+    # takes one, so at most depth items are fetched ahead of the consumer
+    slots = threading.Semaphore(depth)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            iterator = iter(iterable)
+            while True:
+                while not slots.acquire(timeout=0.1):
+                    if stopped.is_set():
+                        return
+                if stopped.is_set():
+                    return
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    results.put((done, None))
+                    return
+                results.put((item, None))
+        except BaseException as e:
+            results.put((done, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = results.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            slots.release()
+            yield item
+    finally:
+        stopped.set()
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls made with the same key, so that only the first caller
+    does the work while any others arriving before it finishes wait for it and share
+    its result, or its exception.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Returns the number of seconds to wait from the value of a Retry-After header,
+    which may be given either as a number of seconds or as an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_json_decoder(name: str = "json") -> Callable[[bytes], Any]:
+    """
+    Returns a function which decodes a JSON document from bytes, using the named
+    backend. "orjson" and "msgspec" are faster for large payloads but need to be
+    installed separately, while "auto" picks the fastest one available and falls
+    back to the standard library "json" module.
+    """
+    if name in ["orjson", "auto"]:
+        try:
+            import orjson  # type: ignore
+
+            return orjson.loads
+        except ImportError:
+            if name == "orjson":
+                raise
+
+    if name in ["msgspec", "auto"]:
+        try:
+            import msgspec  # type: ignore
+
+            decoder = msgspec.json.Decoder()
+
+            def msgspec_loads(data: bytes) -> Any:
+                # Raise the same error type as the other backends
+                try:
+                    return decoder.decode(data)
+                except msgspec.DecodeError as e:
+                    raise ValueError(str(e))
+
+            return msgspec_loads
+        except ImportError:
+            if name == "msgspec":
+                raise
+
+    if name in ["json", "auto"]:
+        return json.loads
+
+    raise ValueError(f"Unknown JSON decoder: {name}")
+
+
+def slotted(cls: C) -> C:
+    """
+    Rebuilds the dataclass cls so its fields are stored in __slots__ rather than in
+    a dictionary on each instance, which saves memory for models created in large
+    numbers. This is what dataclass(slots=True) does from Python 3.10.
+
+    The defaults of the fields are kept by the dataclass, so they are removed from
+    the class along with its __dict__ and __weakref__ descriptors. Every base class
+    must also define __slots__ for instances to have no __dict__.
+    """
+    names = tuple(field.name for field in dataclasses.fields(cls))
+    namespace = dict(cls.__dict__)
+    for name in names + ("__dict__", "__weakref__"):
+        namespace.pop(name, None)
+    namespace["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
 def load_test_data(test_dir: str, test_name: str) -> dict:
     """
     Returns the contents of a json file at location of:
@@ -0,0 +1,92 @@
+import dataclasses
+from typing import Any, Dict, Tuple, Union, get_type_hints
+
+# The type and dataclass field of each field of the models viewed so far
+_fields: Dict[type, Dict[str, Tuple[Any, dataclasses.Field]]] = {}
+
+
+def _model_fields(klass: type) -> Dict[str, Tuple[Any, dataclasses.Field]]:
+    try:
+        return _fields[klass]
+    except KeyError:
+        hints = get_type_hints(klass)
+        fields = {x.name: (hints[x.name], x) for x in dataclasses.fields(klass)}
+        _fields[klass] = fields
+        return fields
+
+
+def _unwrap_optional(field_type: Any) -> Any:
+    if getattr(field_type, "__origin__", None) is Union:
+        args = [x for x in field_type.__args__ if x is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return field_type
+
+
+def _needs_view(field_type: Any) -> bool:
+    field_type = _unwrap_optional(field_type)
+    if dataclasses.is_dataclass(field_type):
+        return True
+    if getattr(field_type, "__origin__", None) is list:
+        return _needs_view(field_type.__args__[0])
+    return False
+
+
+def _view_value(field_type: Any, value: Any) -> Any:
+    if value is None or not _needs_view(field_type):
+        return value
+    field_type = _unwrap_optional(field_type)
+    if isinstance(field_type, type) and dataclasses.is_dataclass(field_type):
+        return ModelView(field_type, value)
+    return [_view_value(field_type.__args__[0], x) for x in value]
+
+
+class ModelView(object):
+    """
+    A read only view of a model over the dictionary it would be built from.
+
+    Fields are only looked up when they are read, and nested models become views
+    in turn, so reading a few fields from a large response doesn't build every
+    object in it. Fields are read with the same names as on the model, but the
+    model's methods and properties aren't available; to_model() builds the model
+    itself.
+    """
+
+    __slots__ = ("_klass", "_data", "_values")
+
+    def __init__(self, klass: type, data: Dict[str, Any]):
+        self._klass = klass
+        self._data = data
+        self._values: Dict[str, Any] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ModelView.__slots__:
+            raise AttributeError(name)
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+
+        try:
+            field_type, field = _model_fields(self._klass)[name]
+        except KeyError:
+            raise AttributeError(
+                f"'{self._klass.__name__}' object has no attribute '{name}'"
+            )
+
+        if name in self._data:
+            value = _view_value(field_type, self._data[name])
+        elif field.default is not dataclasses.MISSING:
+            value = field.default
+        elif field.default_factory is not dataclasses.MISSING:
+            value = field.default_factory()
+        else:
+            raise AttributeError(f"'{self._klass.__name__}' has no value for '{name}'")
+        self._values[name] = value
+        return value
+
+    def to_model(self) -> Any:
+        return self._klass.from_dict(self._data)  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._klass.__name__}, {self._data!r})"